@@ -4,6 +4,13 @@ A tiny adapter around google-generativeai for consistent usage.
 
 from __future__ import annotations
 
+import hashlib
+import json
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
 from typing import Any, Dict, List, Optional
 
 try:
@@ -11,12 +18,110 @@ try:
 except Exception:  # pragma: no cover - optional import handling
 	genai = None  # type: ignore
 
+try:
+	from google.api_core.exceptions import ResourceExhausted
+except Exception:  # pragma: no cover - optional import handling
+	ResourceExhausted = None  # type: ignore
+
 from .gemini_config import (
 	GEMINI_MODEL,
 	GEMINI_TEMPERATURE,
 	GEMINI_MAX_OUTPUT_TOKENS,
+	GEMINI_RPM,
+	GEMINI_TPM,
+	GEMINI_MAX_RETRIES,
+	GEMINI_MAX_CONCURRENCY,
+	GEMINI_CACHE_SIZE,
+	GEMINI_CACHE_PATH,
 	get_api_key,
 )
+from .gemini_throttle import TokenBucket
+
+# Shared by every client in the process, since the quota is per API key
+_bucket = TokenBucket(GEMINI_RPM, GEMINI_TPM)
+# Bounds requests in flight across the whole process, however many thread
+# pools (documents, chunks) are calling in at once
+_inflight = threading.BoundedSemaphore(max(1, GEMINI_MAX_CONCURRENCY))
+
+
+class ResponseCache:
+	"""
+	Thread-safe in-process LRU of response texts keyed by a hash of the request.
+
+	Repeated prompts (the same chunk re-analysed, the same validation context)
+	are answered without another API call. With a path, entries are also
+	written to a SQLite file so they survive restarts.
+	"""
+
+	def __init__(self, maxsize: int, path: str = ""):
+		self.maxsize = maxsize
+		self._entries: "OrderedDict[bytes, str]" = OrderedDict()
+		self._lock = threading.Lock()
+		self._db: Optional[sqlite3.Connection] = None
+		if path and maxsize > 0:
+			self._db = sqlite3.connect(path, check_same_thread=False)
+			self._db.execute("CREATE TABLE IF NOT EXISTS responses (key BLOB PRIMARY KEY, value TEXT NOT NULL)")
+			self._db.commit()
+
+	@staticmethod
+	def make_key(*parts: str) -> bytes:
+		digest = hashlib.blake2b(digest_size=16)
+		for part in parts:
+			digest.update(part.encode("utf-8"))
+			digest.update(b"\x00")
+		return digest.digest()
+
+	def get(self, key: bytes) -> Optional[str]:
+		with self._lock:
+			value = self._entries.get(key)
+			if value is not None:
+				self._entries.move_to_end(key)
+			elif self._db is not None:
+				row = self._db.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+				if row is not None:
+					value = row[0]
+					self._remember(key, value)
+			return value
+
+	def _remember(self, key: bytes, value: str) -> None:
+		# Caller holds the lock
+		self._entries[key] = value
+		self._entries.move_to_end(key)
+		while len(self._entries) > self.maxsize:
+			self._entries.popitem(last=False)
+
+	def put(self, key: bytes, value: str) -> None:
+		if self.maxsize <= 0:
+			return
+		with self._lock:
+			self._remember(key, value)
+			if self._db is not None:
+				self._db.execute("INSERT OR REPLACE INTO responses (key, value) VALUES (?, ?)", (key, value))
+				self._db.commit()
+
+
+_response_cache = ResponseCache(GEMINI_CACHE_SIZE, GEMINI_CACHE_PATH)
+
+
+def _is_rate_limit_error(exc: Exception) -> bool:
+	if ResourceExhausted is not None and isinstance(exc, ResourceExhausted):
+		return True
+	return "429" in str(exc)
+
+
+def _is_cacheable(resp: Any, text: str) -> bool:
+	"""Only a response that finished normally and holds valid JSON is worth replaying."""
+	try:
+		reason = resp.candidates[0].finish_reason
+	except (AttributeError, IndexError, TypeError):
+		return False
+	if getattr(reason, "name", reason) not in ("STOP", 1):
+		return False
+	try:
+		json.loads(text)
+	except ValueError:
+		return False
+	return True
 
 
 class GeminiClient:
@@ -30,22 +135,52 @@ class GeminiClient:
 		genai.configure(api_key=key)
 		self.model = genai.GenerativeModel(GEMINI_MODEL)
 
-	def generate_json(self, system_prompt: str, user_prompt: str) -> str:
+	def generate_json(self, system_prompt: str, user_prompt: str, max_output_tokens: Optional[int] = None) -> str:
 		"""
-		Generate a response intended to be JSON-only. Returns the raw text.
+		Generate a JSON-only response (JSON response MIME type). Returns the raw text.
+
+		max_output_tokens overrides GEMINI_MAX_OUTPUT_TOKENS for prompts that
+		carry several chunks and need a proportionally larger answer.
 		"""
+		output_tokens = max_output_tokens or GEMINI_MAX_OUTPUT_TOKENS
+		cache_key = ResponseCache.make_key(
+			GEMINI_MODEL, str(GEMINI_TEMPERATURE), str(output_tokens), system_prompt, user_prompt
+		)
+		cached = _response_cache.get(cache_key)
+		if cached is not None:
+			return cached
+
 		content = [
 			{"role": "user", "parts": [system_prompt.strip()]},
 			{"role": "user", "parts": [user_prompt.strip()]},
 		]
-		resp = self.model.generate_content(
-			content,
-			generation_config={
-				"temperature": GEMINI_TEMPERATURE,
-				"max_output_tokens": GEMINI_MAX_OUTPUT_TOKENS,
-				"response_mime_type": "text/plain",
-			},
-		)
+		# Rough estimate (~4 chars per token) of prompt plus worst-case output
+		estimated_tokens = (len(system_prompt) + len(user_prompt)) // 4 + output_tokens
+
+		attempt = 0
+		while True:
+			_bucket.acquire(estimated_tokens)
+			try:
+				with _inflight:
+					resp = self.model.generate_content(
+						content,
+						generation_config={
+							"temperature": GEMINI_TEMPERATURE,
+							"max_output_tokens": output_tokens,
+							"response_mime_type": "application/json",
+						},
+					)
+				break
+			except Exception as e:
+				if attempt >= GEMINI_MAX_RETRIES or not _is_rate_limit_error(e):
+					raise
+				# Exponential backoff with jitter before retrying a 429
+				time.sleep(2 ** attempt + random.uniform(0, 1))
+				attempt += 1
 		# google-generativeai returns a response object with .text
-		return (resp.text or "").strip()
+		text = (resp.text or "").strip()
+		# Truncated, blocked or non-JSON answers are not cached, so a retry asks again
+		if _is_cacheable(resp, text):
+			_response_cache.put(cache_key, text)
+		return text
 
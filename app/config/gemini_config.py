@@ -8,6 +8,25 @@ import os
 GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
 GEMINI_TEMPERATURE = float(os.getenv("GEMINI_TEMPERATURE", "0.1"))
 GEMINI_MAX_OUTPUT_TOKENS = int(os.getenv("GEMINI_MAX_OUTPUT_TOKENS", "1200"))
+# Model's maximum output tokens per response; caps requests that pack several chunks
+GEMINI_OUTPUT_TOKEN_LIMIT = int(os.getenv("GEMINI_OUTPUT_TOKEN_LIMIT", "8192"))
+
+# Max Gemini requests in flight across the process (chunks and documents are sent concurrently)
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "4"))
+
+# Client-side rate limits (requests/tokens per minute); 0 disables a limit.
+# Off by default so paid keys are not throttled; set e.g. GEMINI_RPM=15 on the free tier.
+# Retries on 429 apply either way.
+GEMINI_RPM = int(os.getenv("GEMINI_RPM", "0"))
+GEMINI_TPM = int(os.getenv("GEMINI_TPM", "0"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "3"))
+
+# In-process cache of responses for repeated prompts (0 disables it)
+GEMINI_CACHE_SIZE = int(os.getenv("GEMINI_CACHE_SIZE", "256"))
+
+# Optional SQLite file that keeps cached responses across restarts (empty disables it).
+# Responses contain the detected PII values, so keep this file as protected as the inputs.
+GEMINI_CACHE_PATH = os.getenv("GEMINI_CACHE_PATH", "")
 
 # Env var names to try for the API key
 API_KEY_ENV_VARS = ("GOOGLE_API_KEY", "GEMINI_API_KEY")
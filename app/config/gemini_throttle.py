@@ -0,0 +1,57 @@
+"""
+Client-side request/token bucket used to stay under Gemini rate limits.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+
+
+class TokenBucket:
+	"""
+	Proactive limiter for requests-per-minute and tokens-per-minute.
+
+	Both budgets refill continuously; acquire() blocks until the request and
+	its estimated tokens fit, so calls wait here instead of failing with 429.
+	A limit of 0 (or less) disables that budget; with both disabled acquire()
+	returns immediately.
+	"""
+
+	def __init__(self, rpm: int, tpm: int):
+		self.max_requests = float(rpm) if rpm > 0 else float("inf")
+		self.max_tokens = float(tpm) if tpm > 0 else float("inf")
+		self.enabled = rpm > 0 or tpm > 0
+		self.available_requests = self.max_requests
+		self.available_tokens = self.max_tokens
+		self._last_refill = time.monotonic()
+		self._lock = threading.Lock()
+
+	def _refill(self) -> None:
+		now = time.monotonic()
+		elapsed = now - self._last_refill
+		self._last_refill = now
+		self.available_requests = min(self.max_requests, self.available_requests + elapsed * self.max_requests / 60.0)
+		self.available_tokens = min(self.max_tokens, self.available_tokens + elapsed * self.max_tokens / 60.0)
+
+	def acquire(self, estimated_tokens: int = 0) -> None:
+		"""Block until one request and estimated_tokens are available, then consume them."""
+		if not self.enabled:
+			return
+		# A single oversized request can never exceed the full bucket
+		tokens = min(float(max(0, estimated_tokens)), self.max_tokens)
+		while True:
+			with self._lock:
+				self._refill()
+				if self.available_requests >= 1 and self.available_tokens >= tokens:
+					self.available_requests -= 1
+					self.available_tokens -= tokens
+					return
+				# Sleep just long enough for the scarcer budget to refill
+				wait_requests = wait_tokens = 0.0
+				if self.available_requests < 1:
+					wait_requests = (1 - self.available_requests) * 60.0 / self.max_requests
+				if self.available_tokens < tokens:
+					wait_tokens = (tokens - self.available_tokens) * 60.0 / self.max_tokens
+				wait = max(wait_requests, wait_tokens, 0.01)
+			time.sleep(wait)
@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.responses import FileResponse
 from fastapi.staticfiles import StaticFiles
@@ -10,7 +11,19 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Project Protector API", version="0.1")
+# Start loading the NER model in the background and set up the Gemini client,
+# so the first request does not wait for either
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    try:
+        from app.services.pii_main import warm_load_model, ensure_gemini_client
+        warm_load_model()
+        ensure_gemini_client()
+    except Exception as e:
+        logger.warning(f"⚠️ Model warm-up not started: {e}")
+    yield
+
+app = FastAPI(title="Project Protector API", version="0.1", lifespan=lifespan)
 
 # Initialize audit database (optional, non-blocking)
 audit_enabled = False
@@ -1,22 +1,24 @@
 # app/services/docx_processor.py
 
-import os
 import json
-import re
+import logging
 import hashlib
 from cryptography.fernet import Fernet
 from docx import Document
 from app.services.pii_main import extract_all_pii
+from app.services.enc_tags import split_enc_tags, compile_replacement, replace_outside_tags
+
+logger = logging.getLogger(__name__)
 
 def mask_docx_sensitive_text(docx_path: str, key_path: str = None, enabled_pii_categories=None):
     if key_path is None:
         key_path = docx_path.replace(".docx", ".key")
 
     # Load or generate a key
-    if os.path.exists(key_path):
+    try:
         with open(key_path, "rb") as f:
             key = f.read()
-    else:
+    except FileNotFoundError:
         key = Fernet.generate_key()
         with open(key_path, "wb") as f:
             f.write(key)
@@ -41,8 +43,7 @@ def mask_docx_sensitive_text(docx_path: str, key_path: str = None, enabled_pii_c
             try:
                 encrypted = fernet.encrypt(value.encode()).decode()
                 # Use hash for unique tags like in text processor
-                import hashlib
-                value_hash = hashlib.md5(value.encode()).hexdigest()[:8]
+                value_hash = hashlib.blake2b(value.encode(), digest_size=4).hexdigest()
                 unique_tag = f"[ENC:{label}_{value_hash}]"
 
                 unique_pii[value] = {"encrypted": encrypted, "tag": unique_tag}
@@ -53,32 +54,36 @@ def mask_docx_sensitive_text(docx_path: str, key_path: str = None, enabled_pii_c
                     "masked": unique_tag
                 })
             except Exception as e:
-                print(f"[ERROR] Failed to encrypt '{value}': {e}")
+                logger.error("Failed to encrypt '%s': %s", value, e)
 
     # Sort by length for safe replacement
     sorted_pii_items = sorted(unique_pii.items(), key=lambda x: len(x[0]), reverse=True)
 
-    # Apply safe replacement to each paragraph
-    for para in document.paragraphs:
-        if para.text.strip():  # Only process non-empty paragraphs
-            masked_text = para.text
-
-            for pii_value, pii_info in sorted_pii_items:
-                # Use the same safe replacement logic as text processor
-                parts = re.split(r'(\[ENC:[^\]]+\])', masked_text)
-
-                for i in range(len(parts)):
-                    if i % 2 == 0 and not parts[i].startswith('[ENC:'):
-                        escaped_pii = re.escape(pii_value)
-                        if len(pii_value) == 1 and pii_value.isdigit():
-                            pattern = r'\b' + escaped_pii + r'\b'
-                        else:
-                            pattern = escaped_pii
-                        parts[i] = re.sub(pattern, pii_info["tag"], parts[i])
-
-                masked_text = ''.join(parts)
-
-            para.text = masked_text
+    # Compile each replacement pattern once instead of per paragraph and text part;
+    # other values are matched literally, which str.split does directly
+    replacements = [
+        (pii_value, compile_replacement(pii_value), pii_info["tag"])
+        for pii_value, pii_info in sorted_pii_items
+    ]
+
+    # Documents without PII are saved as-is
+    if replacements:
+        # Apply safe replacement to each paragraph
+        for para in document.paragraphs:
+            if para.text.strip():  # Only process non-empty paragraphs
+                masked_text = para.text
+                # Skip paragraphs none of the values occur in, leaving their runs untouched
+                candidates = [replacement for replacement in replacements if replacement[0] in masked_text]
+                if not candidates:
+                    continue
+
+                # Use the same safe replacement logic as text processor: split around tags
+                # once per paragraph and keep that shape for every value
+                segments = split_enc_tags(masked_text)
+                for pii_value, pattern, tag in candidates:
+                    segments = replace_outside_tags(segments, pii_value, pattern, tag)
+
+                para.text = ''.join(segments)
 
     # Output File
     masked_path = docx_path.replace(".docx", ".masked.docx")
@@ -86,7 +91,7 @@ def mask_docx_sensitive_text(docx_path: str, key_path: str = None, enabled_pii_c
 
     json_path = docx_path.replace(".docx", ".masked.json")
     with open(json_path, "w", encoding="utf-8") as f:
-        json.dump(masked_pii, f, ensure_ascii=False, indent=2)
+        f.write(json.dumps(masked_pii, ensure_ascii=False, indent=2))
 
     return masked_path, json_path, key_path
 
@@ -0,0 +1,43 @@
+# app/services/enc_tags.py
+
+import re
+
+# Splits masked text into plain segments and existing [ENC:...] tags
+ENC_TAG_SPLIT_RE = re.compile(r'(\[ENC:[^\]]+\])')
+
+def split_enc_tags(text):
+    """Split text into alternating [plain, tag, plain, ...] segments"""
+    return ENC_TAG_SPLIT_RE.split(text)
+
+def compile_replacement(pii_value):
+    """
+    Return the pattern a PII value is replaced with, or None to match it literally
+
+    Single digits only match as whole words; other values match anywhere,
+    which str.split does without any regex machinery.
+    """
+    if len(pii_value) == 1 and pii_value.isdigit():
+        return re.compile(r'\b' + re.escape(pii_value) + r'\b')
+    return None
+
+def replace_outside_tags(segments, pii_value, pattern, tag):
+    """
+    Replace pii_value (or pattern, when given) with tag in the plain segments of
+    [plain, tag, plain, ...], returning a list of the same alternating shape
+    (new tags become their own segments)
+    """
+    result = []
+    for i, segment in enumerate(segments):
+        # Only replace in parts that are not encryption tags (odd indices are tags)
+        if i % 2 or segment.startswith('[ENC:'):
+            result.append(segment)
+            continue
+        pieces = pattern.split(segment) if pattern is not None else segment.split(pii_value)
+        if len(pieces) == 1:
+            result.append(segment)
+            continue
+        result.append(pieces[0])
+        for piece in pieces[1:]:
+            result.append(tag)
+            result.append(piece)
+    return result
@@ -13,6 +13,42 @@ from app.services.pii_main import extract_all_pii, extract_from_dictionaries
 from app.resources.dictionaries import NAMES, ORG_NAMES, RACES, STATUS
 import re
 
+# ✅ Business-level ignored words (ignored only in image mask scenarios)
+# Note: Using exact word matching to avoid false positives
+# Built once at import; entries are lowercase to match the normalized values
+IGNORE_WORDS = frozenset({
+    # Document artifacts and watermarks
+    "copy", "confidential", "draft", "sample", "example", "template", "specimen",
+    "watermark", "void", "duplicate", "original", "certified", "true copy",
+
+    # Malaysian document terms
+    "malaysia", "mykad", "identity", "card", "identity card", "kad", "pengenalan",
+    "kad pengenalan", "warganegara", "lelaki", "perempuan", "bujang", "kawin",
+    "male", "female", "citizen", "not citizen",
+
+    # Generic form labels (exact matches only)
+    "name", "address", "phone", "email", "type", "number",
+    "identification", "passport",
+
+    # Banking terms (form labels, not actual data)
+    "bank", "account", "account type", "account no", "account number",
+    "bank account", "bank name", "bank statement", "statement",
+    "account holder", "account holder name",
+    "public bank", "maybank", "cimb", "hsbc", "standard chartered", "uob", "ocbc",
+
+    # Common short words that cause false positives (removed)
+    # Removed: "id", "no", "my", "k", "your" - too generic and cause false matches
+
+    # Specific document headers/footers
+    "bank statement example", "four bank", "specimen copy"
+})
+
+# Categories the user can switch on/off; everything else is always masked
+SELECTABLE_CATEGORIES = frozenset({'NAMES', 'RACES', 'ORG_NAMES', 'STATUS', 'LOCATIONS', 'RELIGIONS'})
+
+# Word tokens for multi-word ignore phrase matching
+_WORD_RE = re.compile(r'\b\w+\b')
+
 def _should_ignore_word(text, ignore_words):
     """
     Check if text should be ignored based on exact word matching.
@@ -34,7 +70,7 @@ def _should_ignore_word(text, ignore_words):
 
     # For multi-word ignore phrases, check if the entire text matches
     # Split text into words and check if it forms any ignore phrase
-    text_words = re.findall(r'\b\w+\b', text)
+    text_words = _WORD_RE.findall(text)
     text_phrase = ' '.join(text_words)
 
     if text_phrase in ignore_words:
@@ -109,12 +145,10 @@ def iou(bbox1, bbox2):
 
 def load_or_generate_valid_key(key_path):
     try:
-        if os.path.exists(key_path):
-            with open(key_path, "rb") as f:
-                key = f.read()
-            Fernet(key)
-        else:
-            raise ValueError("Key file does not exist")
+        # A missing file raises FileNotFoundError here, so no separate exists() check
+        with open(key_path, "rb") as f:
+            key = f.read()
+        Fernet(key)
     except Exception as e:
         print(f"[WARN] Invalid or corrupted key (or path conflict): {e}")
         key = Fernet.generate_key()
@@ -187,42 +221,9 @@ def mask_sensitive_text(image_path, key_path, output_json_path=None, output_imag
     pii_entries = extract_all_pii(full_text, enabled_pii_categories)
     print(f"[INFO] Extracted {len(pii_entries)} PII items (with selective filtering)")
 
-    # ✅ Business-level ignored words (ignored only in image mask scenarios)
-    # Note: Using exact word matching to avoid false positives
-    IGNORE_WORDS = {
-        # Document artifacts and watermarks
-        "copy", "confidential", "draft", "sample", "example", "template", "specimen",
-        "watermark", "void", "duplicate", "original", "certified", "true copy",
-
-        # Malaysian document terms
-        "malaysia", "mykad", "identity", "card", "identity card", "kad", "pengenalan",
-        "kad pengenalan", "warganegara", "lelaki", "perempuan", "bujang", "kawin",
-        "male", "female", "citizen", "not citizen",
-
-        # Generic form labels (exact matches only)
-        "name", "address", "phone", "email", "type", "number",
-        "identification", "passport",
-
-        # Banking terms (form labels, not actual data)
-        "bank", "account", "account type", "account no", "account number",
-        "bank account", "bank name", "bank statement", "statement",
-        "account holder", "account holder name",
-        "public bank", "maybank", "cimb", "hsbc", "standard chartered", "uob", "ocbc",
-
-        # Common short words that cause false positives (removed)
-        # Removed: "id", "no", "my", "k", "your" - too generic and cause false matches
-
-        # Specific document headers/footers
-        "bank statement example", "four bank", "specimen copy"
-    }
-
-    # ✅ Malaysia location whitelist (for LOC filtering)
-    MALAYSIA_LOCATIONS = {
-    }
-
     # 过滤和处理PII结果
     filtered_pii = []
-    selectable_categories = ['NAMES', 'RACES', 'ORG_NAMES', 'STATUS', 'LOCATIONS', 'RELIGIONS']
+    enabled_set = frozenset(enabled_pii_categories)
 
     print("[INFO] Processing PII detection results:")
     for label, value in pii_entries:
@@ -236,8 +237,8 @@ def mask_sensitive_text(image_path, key_path, output_json_path=None, output_imag
             print(f"[SKIP] Ignoring non-sensitive word: {original_val}")
             continue
         # Selective PII categories: Only those in enabled_categories will be masked
-        if label in selectable_categories:
-            if label in enabled_pii_categories:
+        if label in SELECTABLE_CATEGORIES:
+            if label in enabled_set:
                 filtered_pii.append((label, original_val))
                 print(f"[MASK] Selective PII - {label}: {original_val}")
             else:
@@ -249,24 +250,19 @@ def mask_sensitive_text(image_path, key_path, output_json_path=None, output_imag
     # Update keywords
     keywords = list(set(value for _, value in filtered_pii))
     print(f"[INFO] Will finally mask {len(keywords)} keywords")
+    # One alternation over the lowercased keywords: a single scan per OCR line
+    # tells whether any keyword occurs in it
+    keyword_re = re.compile('|'.join(re.escape(keyword.lower()) for keyword in keywords)) if keywords else None
     # === Step 4: Load or generate a key ===
     key = load_or_generate_valid_key(key_path)
     fernet = Fernet(key)
     seen = []
     # === Step 5: Traverse the original OCR results and match keywords (support cross-line keywords) ===
     for bbox, text, confidence in results:
-        matched = False
-        for keyword in keywords:
-            # Checks if a keyword "spreads across lines" but the current line contains part of it
-            if keyword.lower() in text.lower():
-                matched = True
-                break
-            # Or: Is the current text a substring (prefix/suffix) of the keyword, and is there another part nearby?
-            if (keyword.lower().startswith(text.lower()) or keyword.lower().endswith(text.lower())) and len(text) > 3:
-                # Enable "cross-row merge detection" (advanced option available, but simple processing is provided here)
-                pass  # Scalable: Search neighboring box stitching
-
-        if not matched:
+        text_lower = text.lower()
+        # Checks if the current line contains any keyword
+        # (cross-line keywords would need neighboring box stitching, not handled here)
+        if keyword_re is None or not keyword_re.search(text_lower):
             continue
 
         # Checks if this text should be ignored (checked before masking)
@@ -277,12 +273,12 @@ def mask_sensitive_text(image_path, key_path, output_json_path=None, output_imag
         # Deduplication: Use IOU to determine whether it has been processed
         duplicate = False
         for s in seen:
-            if iou(bbox, s["bbox"]) > 0.85 and text.lower() == s["text"].lower():
+            if iou(bbox, s["bbox"]) > 0.85 and text_lower == s["text_lower"]:
                 duplicate = True
                 break
         if duplicate:
             continue
-        seen.append({"bbox": bbox, "text": text})
+        seen.append({"bbox": bbox, "text": text, "text_lower": text_lower})
 
         # === Masking + Encryption ===
         x_coords = [int(p[0]) for p in bbox]
@@ -5,6 +5,10 @@ from app.services.ocr_jpeg import mask_sensitive_text
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import re
 
+# Page-number patterns for masked page images (page_1_masked.png) and page images (page_1.jpg)
+_MASKED_PAGE_RE = re.compile(r'page_(\d+)_masked\.(jpg|jpeg|png)$', re.IGNORECASE)
+_PAGE_NUMBER_RE = re.compile(r'page_(\d+)')
+
 def pdf_to_images(pdf_path, output_folder, dpi=100, first_page=None, last_page=None):
     poppler_path = os.path.abspath("C:\\Project Protector\\env\\Lib\\poppler-24.08.0\\Library\\bin")
     os.makedirs(output_folder, exist_ok=True)
@@ -40,7 +44,7 @@ def process_pdf_images(image_dir, reader, key_path="aes_key.key"):
 def images_to_pdf(image_folder, output_pdf_path):
     def extract_page_number(filename):
         # Extract 1 from page_1_masked.png as the sort key
-        match = re.search(r'page_(\d+)_masked\.(jpg|jpeg|png)$', filename, re.IGNORECASE)
+        match = _MASKED_PAGE_RE.search(filename)
         return int(match.group(1)) if match else float('inf')  # Unmatched files are sorted last
 
     # Only files containing *_masked
@@ -62,8 +66,7 @@ def process_image_with_mask(image_path, reader, key_path, enabled_pii_categories
     print(f"[THREAD] Processing: {image_path}")
 
     # Extract page number from image path (e.g., page_1.jpg -> 1)
-    import re
-    page_match = re.search(r'page_(\d+)', os.path.basename(image_path))
+    page_match = _PAGE_NUMBER_RE.search(os.path.basename(image_path))
     page_number = int(page_match.group(1)) if page_match else 1
 
     # Create individual JSON path for this page
@@ -2,41 +2,193 @@
 import re
 import os
 import json
+import logging
 import time
-from datetime import datetime
+import functools
+import hashlib
+import threading
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
 from typing import List, Tuple, Optional, Dict, Any
 from app.resources.dictionaries import NAMES, ORG_NAMES, RACES, STATUS, LOCATIONS, RELIGIONS
+from app.config.gemini_config import (
+    GEMINI_MAX_CONCURRENCY, GEMINI_MAX_OUTPUT_TOKENS, GEMINI_OUTPUT_TOKEN_LIMIT, get_api_key
+)
+
+# Optional Aho-Corasick backend for dictionary matching
+try:
+    import ahocorasick
+    AHOCORASICK_ENABLED = True
+except ImportError:
+    AHOCORASICK_ENABLED = False
+
+logger = logging.getLogger(__name__)
 
 # === Delay loading models ===
 ner_pipeline = None
 model_loaded = False
 
+# NER runtime: "onnx" uses the exported ONNX model (INT8 file preferred) when
+# it is present and falls back to TensorFlow; "tf" always uses TensorFlow;
+# "gliner" uses a GLiNER span model (optional gliner package)
+NER_MODEL_NAME = "jplu/tf-xlm-r-ner-40-lang"
+NER_RUNTIME = os.getenv("NER_RUNTIME", "onnx").lower()
+NER_ONNX_DIR = os.getenv("NER_ONNX_DIR", os.path.join("models", "ner-onnx"))
+NER_ONNX_FILE = os.getenv("NER_ONNX_FILE", "model-int8.onnx")
+# Export the model to NER_ONNX_DIR on first load when no ONNX file exists yet
+NER_ONNX_AUTO_EXPORT = os.getenv("NER_ONNX_AUTO_EXPORT", "0") == "1"
+# Pipeline aggregation strategy ("simple", "first", ...); "none" keeps raw
+# tokens and merges them with _stitch_ner_tokens
+NER_AGGREGATION = os.getenv("NER_AGGREGATION", "none").lower()
+NER_GLINER_MODEL = os.getenv("NER_GLINER_MODEL", "urchade/gliner_multi-v2.1")
+NER_GLINER_THRESHOLD = float(os.getenv("NER_GLINER_THRESHOLD", "0.5"))
+# GLiNER prompt labels mapped to the labels the token-classification model emits
+GLINER_LABELS = {"person": "PER", "organization": "ORG", "location": "LOC"}
+
+def _ner_aggregation_strategy():
+    """NER_AGGREGATION as the pipeline expects it (None for raw tokens)"""
+    return None if NER_AGGREGATION == "none" else NER_AGGREGATION
+
+def _onnx_session_kwargs():
+    """Full graph optimizations, on the GPU when onnxruntime has CUDA available"""
+    import onnxruntime
+
+    options = onnxruntime.SessionOptions()
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if "CUDAExecutionProvider" in onnxruntime.get_available_providers():
+        provider = "CUDAExecutionProvider"
+    else:
+        provider = "CPUExecutionProvider"
+    return {"session_options": options, "provider": provider}
+
+def _load_onnx_ner_pipeline(tokenizer):
+    """Build the NER pipeline on ONNX Runtime, or return None if it is unavailable"""
+    if NER_RUNTIME != "onnx":
+        return None
+    onnx_file = next(
+        (name for name in (NER_ONNX_FILE, "model.onnx") if os.path.exists(os.path.join(NER_ONNX_DIR, name))),
+        None
+    )
+    if onnx_file is None and not NER_ONNX_AUTO_EXPORT:
+        return None
+    try:
+        from optimum.onnxruntime import ORTModelForTokenClassification
+        from transformers import pipeline
+
+        session_kwargs = _onnx_session_kwargs()
+        if onnx_file is None:
+            # One-time export, saved so later loads only read the .onnx file.
+            # The checkpoint only ships TensorFlow weights, so export from TF
+            # (needs tensorflow and tf2onnx), as `optimum-cli export onnx --framework tf` does
+            from optimum.exporters.onnx import main_export
+
+            logger.info("Exporting NER model to ONNX in %s (one-time)...", NER_ONNX_DIR)
+            main_export(NER_MODEL_NAME, output=NER_ONNX_DIR, task="token-classification", framework="tf")
+            onnx_file = "model.onnx"
+        model = ORTModelForTokenClassification.from_pretrained(NER_ONNX_DIR, file_name=onnx_file, **session_kwargs)
+        return pipeline(
+            task="ner",
+            model=model,
+            tokenizer=tokenizer,
+            aggregation_strategy=_ner_aggregation_strategy()
+        )
+    except Exception as e:
+        logger.warning("ONNX NER model unavailable, falling back to TensorFlow: %s", e)
+        return None
+
+class _GlinerNER:
+    """Adapter giving a GLiNER model the call shape of the transformers NER pipeline"""
+
+    def __init__(self, model):
+        self.model = model
+        self.labels = list(GLINER_LABELS)
+
+    def _to_tokens(self, entities):
+        # One B- token per span; the stitcher turns each into a single (label, word) entity
+        return [{"word": ent["text"], "entity": "B-" + GLINER_LABELS[ent["label"]]}
+                for ent in entities if ent["label"] in GLINER_LABELS]
+
+    def __call__(self, texts, batch_size=8):
+        if isinstance(texts, str):
+            return self._to_tokens(self.model.predict_entities(texts, self.labels, threshold=NER_GLINER_THRESHOLD))
+        results = []
+        for i in range(0, len(texts), batch_size):
+            batch = self.model.batch_predict_entities(texts[i:i + batch_size], self.labels, threshold=NER_GLINER_THRESHOLD)
+            results.extend(self._to_tokens(entities) for entities in batch)
+        return results
+
+def _load_gliner_ner():
+    """Load the GLiNER span model, or return None if it is unavailable"""
+    try:
+        from gliner import GLiNER
+
+        return _GlinerNER(GLiNER.from_pretrained(NER_GLINER_MODEL))
+    except Exception as e:
+        logger.warning("GLiNER NER model unavailable, falling back to TensorFlow: %s", e)
+        return None
+
 def load_model():
     """Lazy load the ML model only when needed"""
     global ner_pipeline, model_loaded
     if not model_loaded:
         try:
-            print("🔄 Loading ML model for PII detection...")
-            from transformers import TFAutoModelForTokenClassification, AutoTokenizer, pipeline
-
-            model_name = "jplu/tf-xlm-r-ner-40-lang"
-            tokenizer = AutoTokenizer.from_pretrained(model_name, use_fast=False)
-            model = TFAutoModelForTokenClassification.from_pretrained(model_name)
-
-            ner_pipeline = pipeline(
-                task="ner",
-                model=model,
-                tokenizer=tokenizer,
-                framework="tf",
-                aggregation_strategy=None
-            )
+            logger.info("Loading ML model for PII detection...")
+            if NER_RUNTIME == "gliner":
+                ner_pipeline = _load_gliner_ner()
+                if ner_pipeline is not None:
+                    logger.info("ML model loaded successfully (GLiNER)")
+                    model_loaded = True
+                    return
+            from transformers import AutoTokenizer, pipeline
+
+            try:
+                # Rust tokenizer; converted from the SentencePiece model on first load
+                tokenizer = AutoTokenizer.from_pretrained(NER_MODEL_NAME, use_fast=True)
+            except Exception as e:
+                logger.warning("Fast tokenizer unavailable, using the slow tokenizer: %s", e)
+                tokenizer = AutoTokenizer.from_pretrained(NER_MODEL_NAME, use_fast=False)
+
+            ner_pipeline = _load_onnx_ner_pipeline(tokenizer)
+            if ner_pipeline is None:
+                from transformers import TFAutoModelForTokenClassification
+
+                model = TFAutoModelForTokenClassification.from_pretrained(NER_MODEL_NAME)
+                ner_pipeline = pipeline(
+                    task="ner",
+                    model=model,
+                    tokenizer=tokenizer,
+                    framework="tf",
+                    aggregation_strategy=_ner_aggregation_strategy()
+                )
+                logger.info("ML model loaded successfully")
+            else:
+                logger.info("ML model loaded successfully (ONNX Runtime)")
             model_loaded = True
-            print("✅ ML model loaded successfully")
         except Exception as e:
-            print(f"❌ Failed to load ML model: {e}")
+            logger.error("Failed to load ML model: %s", e)
             # Fallback to regex-only detection
             model_loaded = False
 
+_ner_lock = threading.Lock()
+
+def _get_ner():
+    """Return the NER pipeline, loading it if needed (None if unavailable); thread-safe"""
+    if ner_pipeline is not None:
+        return ner_pipeline
+    # A failed load is not remembered, so the next call tries again
+    with _ner_lock:
+        load_model()
+    if ner_pipeline is None:
+        logger.warning("NER model not available, using regex-only detection")
+    return ner_pipeline
+
+def warm_load_model():
+    """Start loading the NER model in a background thread; NER callers block on the load lock until it is ready"""
+    if model_loaded:
+        return
+    threading.Thread(target=_get_ner, name="ner-warm-load", daemon=True).start()
+
 # === Gemini API Integration ===
 gemini_enabled = False
 gemini_client = None
@@ -47,22 +199,51 @@ def load_gemini_client():
     try:
         from app.config.gemini_adapter import GeminiClient
     except Exception as e:
-        print(f"[WARN] Gemini adapter not available: {e}")
-        print("[INFO] Gemini PII detection disabled - using Presidio + NER only")
+        logger.warning("Gemini adapter not available: %s", e)
+        logger.info("Gemini PII detection disabled - using Presidio + NER only")
         gemini_enabled = False
         return False
 
     try:
         gemini_client = GeminiClient()
         gemini_enabled = True
-        print("✅ Gemini API client initialized successfully")
+        logger.info("Gemini API client initialized successfully")
         return True
     except Exception as e:
-        print(f"[WARN] Failed to initialize Gemini client: {e}")
-        print("[INFO] Gemini PII detection disabled - using Presidio + NER only")
+        logger.warning("Failed to initialize Gemini client: %s", e)
+        logger.info("Gemini PII detection disabled - using Presidio + NER only")
         gemini_enabled = False
         return False
 
+# Seconds to wait before retrying a Gemini client initialization that failed with a key set
+GEMINI_INIT_RETRY_SECONDS = 60
+
+_gemini_init_attempted = False
+_gemini_retry_at = 0.0
+_gemini_init_lock = threading.Lock()
+
+def _gemini_init_due():
+    return not gemini_enabled and not _gemini_init_attempted and time.monotonic() >= _gemini_retry_at
+
+def ensure_gemini_client():
+    """
+    Initialize the Gemini client on first use
+
+    A missing API key is final, so later calls return at once. Any other
+    failure (e.g. a network error while building the client) is retried on
+    a call made after GEMINI_INIT_RETRY_SECONDS.
+    """
+    global _gemini_init_attempted, _gemini_retry_at
+    if _gemini_init_due():
+        with _gemini_init_lock:
+            if _gemini_init_due():
+                if get_api_key() is None:
+                    logger.info("Gemini API key not set - using Presidio + NER only")
+                    _gemini_init_attempted = True
+                elif not load_gemini_client():
+                    _gemini_retry_at = time.monotonic() + GEMINI_INIT_RETRY_SECONDS
+    return gemini_enabled
+
 def chunk_text_intelligently(text: str, max_chunk_size: int = 3000) -> List[str]:
     """
     Intelligently chunk text to avoid breaking PII entities across chunks
@@ -78,82 +259,179 @@ def chunk_text_intelligently(text: str, max_chunk_size: int = 3000) -> List[str]
         return [text]
 
     chunks = []
-    current_chunk = ""
+    # Collect pieces plus a running length instead of growing one string
+    current_parts = []
+    current_len = 0
 
     # Split by paragraphs first, then sentences if needed
     paragraphs = text.split('\n\n')
 
     for paragraph in paragraphs:
-        # If adding this paragraph would exceed chunk size
-        if len(current_chunk) + len(paragraph) > max_chunk_size:
-            if current_chunk:
-                chunks.append(current_chunk.strip())
-                current_chunk = ""
+        # If adding this paragraph (and its separator) would exceed chunk size
+        if current_len + len(paragraph) + (2 if current_len else 0) > max_chunk_size:
+            if current_len:
+                chunks.append(''.join(current_parts).strip())
+                current_parts = []
+                current_len = 0
 
             # If single paragraph is too long, split by sentences
             if len(paragraph) > max_chunk_size:
                 sentences = paragraph.split('. ')
-                for sentence in sentences:
-                    if len(current_chunk) + len(sentence) > max_chunk_size:
-                        if current_chunk:
-                            chunks.append(current_chunk.strip())
-                            current_chunk = ""
-                    current_chunk += sentence + ". "
+                last_index = len(sentences) - 1
+                for index, sentence in enumerate(sentences):
+                    # Only restore the '. ' that split() removed, not one after the last sentence
+                    piece_len = len(sentence) + (2 if index < last_index else 0)
+                    if current_len + piece_len > max_chunk_size:
+                        if current_len:
+                            chunks.append(''.join(current_parts).strip())
+                            current_parts = []
+                            current_len = 0
+                    current_parts.append(sentence)
+                    if index < last_index:
+                        current_parts.append(". ")
+                    current_len += piece_len
+
+                # Close the sentence chunk so it does not leak into the next paragraph
+                if current_len:
+                    chunks.append(''.join(current_parts).strip())
+                    current_parts = []
+                    current_len = 0
             else:
-                current_chunk = paragraph
+                current_parts = [paragraph]
+                current_len = len(paragraph)
+        elif current_len:
+            current_parts.append("\n\n")
+            current_parts.append(paragraph)
+            current_len += len(paragraph) + 2
         else:
-            current_chunk += "\n\n" + paragraph if current_chunk else paragraph
+            current_parts = [paragraph]
+            current_len = len(paragraph)
 
-    if current_chunk.strip():
-        chunks.append(current_chunk.strip())
+    current_chunk = ''.join(current_parts).strip()
+    if current_chunk:
+        chunks.append(current_chunk)
 
     return chunks
 
-def extract_pii_with_gemini(text: str, enabled_categories: Optional[List[str]] = None) -> List[Tuple[str, str]]:
+# Category descriptions used in the Gemini detection prompt
+_GEMINI_CATEGORY_DESCRIPTIONS = {
+    "NAMES": "Personal names (Malaysian names like 'Ahmad bin Ali', 'WONG JUN KEAT', 'Ramba anak Sumping')",
+    "RACES": "Ethnic/racial information (Malay, Chinese, Indian, Iban, Dayak, etc.)",
+    "ORG_NAMES": "Company and organization names (banks, corporations, government agencies)",
+    "STATUS": "Marital/social status (married, single, etc.)",
+    "LOCATIONS": "Geographic locations and addresses (Malaysian cities, states, postal codes)",
+    "RELIGIONS": "Religious affiliations",
+    "TRANSACTION NAME": "Transaction descriptions and references"
+}
+
+def pack_chunks(text_chunks: List[str], max_tokens: int = 2500, max_chunks: Optional[int] = None) -> List[List[str]]:
     """
-    Use Gemini to identify PII in text with focus on Malaysian context and intelligent chunking
+    Group consecutive text chunks into bins that fit one Gemini request
 
     Args:
-        text: Text to analyze
-        enabled_categories: List of enabled PII categories
+        text_chunks: Chunks from chunk_text_intelligently
+        max_tokens: Approximate token budget per bin (~4 characters per token)
+        max_chunks: Maximum number of chunks per bin (no limit if None)
 
     Returns:
-        List of (label, value) tuples
+        List of bins, each a list of chunks in original order
     """
-    if not gemini_enabled or not gemini_client:
-        return []
+    bins = []
+    current_bin = []
+    current_tokens = 0
+
+    for chunk in text_chunks:
+        chunk_tokens = len(chunk) // 4 + 1
+        # A chunk larger than the budget still gets a bin of its own
+        if current_bin and (
+            current_tokens + chunk_tokens > max_tokens
+            or (max_chunks is not None and len(current_bin) >= max_chunks)
+        ):
+            bins.append(current_bin)
+            current_bin = []
+            current_tokens = 0
+        current_bin.append(chunk)
+        current_tokens += chunk_tokens
+
+    if current_bin:
+        bins.append(current_bin)
+
+    return bins
+
+# Packed chunks whose per-chunk output budgets fit in the model's output limit
+_MAX_CHUNKS_PER_REQUEST = max(1, GEMINI_OUTPUT_TOKEN_LIMIT // GEMINI_MAX_OUTPUT_TOKENS)
+
+_JSON_DECODER = json.JSONDecoder()
+
+def _parse_json_response(response_text: str):
+    """
+    Decode the JSON value in a Gemini response
 
-    if not text or len(text.strip()) < 20:  # Minimum meaningful text length
-        return []
+    Responses are requested as application/json, so the whole text normally
+    parses; otherwise decode from the first '[' or '{' and ignore trailing text.
 
-    # Default to all categories if none specified
-    if enabled_categories is None:
-        enabled_categories = list(SELECTABLE_PII_CATEGORIES.keys())
+    Returns:
+        The decoded object, or None if the response holds no JSON
+    """
+    try:
+        return json.loads(response_text)
+    except json.JSONDecodeError:
+        pass
+    starts = sorted(pos for pos in (response_text.find('['), response_text.find('{')) if pos >= 0)
+    for start in starts:
+        try:
+            return _JSON_DECODER.raw_decode(response_text, start)[0]
+        except json.JSONDecodeError:
+            continue
+    return None
 
-    # Chunk text if it's too long for the LLM
-    text_chunks = chunk_text_intelligently(text, max_chunk_size=3000)
-    all_results = []
+def _parse_gemini_items(pii_data) -> List[Tuple[str, str]]:
+    """Convert a Gemini item list to (label, value) tuples, keeping high-confidence results"""
+    results = []
+    if not isinstance(pii_data, list):
+        return results
+    for item in pii_data:
+        if not (isinstance(item, dict) and 'category' in item and 'value' in item):
+            continue
+        category = item['category']
+        value = item['value']
+        confidence = item.get('confidence', 0.8)
+        # Skip a malformed item rather than losing the rest of the list
+        if not isinstance(category, str) or not isinstance(value, str):
+            continue
+        try:
+            confidence = float(confidence)
+        except (TypeError, ValueError):
+            continue
+        value = value.strip()
 
-    print(f"[Gemini] Processing {len(text_chunks)} text chunks")
+        # Only include high-confidence results
+        if confidence >= 0.7 and value:
+            results.append((category, value))
+    return results
 
-    for chunk_idx, chunk in enumerate(text_chunks):
-        try:
-            # Create enhanced category-specific prompt for financial documents
-            categories_desc = {
-                "NAMES": "Personal names (Malaysian names like 'Ahmad bin Ali', 'WONG JUN KEAT', 'Ramba anak Sumping')",
-                "RACES": "Ethnic/racial information (Malay, Chinese, Indian, Iban, Dayak, etc.)",
-                "ORG_NAMES": "Company and organization names (banks, corporations, government agencies)",
-                "STATUS": "Marital/social status (married, single, etc.)",
-                "LOCATIONS": "Geographic locations and addresses (Malaysian cities, states, postal codes)",
-                "RELIGIONS": "Religious affiliations",
-                "TRANSACTION NAME": "Transaction descriptions and references"
-            }
-
-            enabled_desc = [f"- {cat}: {categories_desc.get(cat, cat)}" for cat in enabled_categories if cat in categories_desc]
-            categories_text = "\n".join(enabled_desc)
-
-            # Enhanced prompt for better financial document detection
-            prompt = f"""You are a PII detection expert specializing in Malaysian financial and identity documents.
+def _detect_pii_in_bin(chunks: List[str], first_idx: int, total_chunks: int, categories_text: str) -> List[Tuple[str, str]]:
+    """
+    Run one Gemini detection request for a bin of text chunks
+
+    Args:
+        chunks: Text chunks packed into this request
+        first_idx: Zero-based index of the first chunk in the document
+        total_chunks: Number of chunks in the document
+        categories_text: Bullet list of enabled categories for the prompt
+
+    Returns:
+        List of (label, value) tuples in chunk order; empty if the request or parsing failed
+    """
+    label = f"{first_idx + 1}-{first_idx + len(chunks)}" if len(chunks) > 1 else f"{first_idx + 1}"
+    try:
+        chunks_text = "\n\n".join(
+            f"===CHUNK {i + 1}===\n{chunk}" for i, chunk in enumerate(chunks)
+        )
+
+        # Enhanced prompt for better financial document detection; the rules
+        # block is sent once per request and shared by every packed chunk
+        prompt = f"""You are a PII detection expert specializing in Malaysian financial and identity documents.
 
 Analyze the following text and identify PII entities. Focus on these categories:
 {categories_text}
@@ -183,53 +461,123 @@ CRITICAL DETECTION RULES:
    - Branch codes and addresses
    - Phone numbers and contact details
 
-Return ONLY a JSON array with this exact format:
-[
-  {{"category": "NAMES", "value": "WONG JUN KEAT", "confidence": 0.95}},
-  {{"category": "ACCOUNT", "value": "1234567890123456", "confidence": 1.0}},
-  {{"category": "PHONE", "value": "03-77855409", "confidence": 0.9}}
-]
+The text is split into {len(chunks)} chunk(s) marked ===CHUNK 1=== to ===CHUNK {len(chunks)}===.
+Return ONLY a JSON object with one array per chunk, in chunk order, with this exact format:
+{{"chunks": [
+  [
+    {{"category": "NAMES", "value": "WONG JUN KEAT", "confidence": 0.95}},
+    {{"category": "ACCOUNT", "value": "1234567890123456", "confidence": 1.0}}
+  ],
+  [
+    {{"category": "PHONE", "value": "03-77855409", "confidence": 0.9}}
+  ]
+]}}
+
+Text to analyze (chunks {label} of {total_chunks}):
+{chunks_text}"""
+
+        # Call Gemini API via adapter
+        system_prompt = "You are a PII detection expert. Return only valid JSON."
+        # Each packed chunk gets the output budget a request of its own would have had
+        response_text = gemini_client.generate_json(
+            system_prompt, prompt,
+            max_output_tokens=min(GEMINI_MAX_OUTPUT_TOKENS * len(chunks), GEMINI_OUTPUT_TOKEN_LIMIT)
+        )
 
-Text to analyze (chunk {chunk_idx + 1}/{len(text_chunks)}):
-{chunk}"""
+        pii_data = _parse_json_response(response_text)
 
-            # Call Gemini API via adapter
-            system_prompt = "You are a PII detection expert. Return only valid JSON."
-            response_text = gemini_client.generate_json(system_prompt, prompt)
+        if isinstance(pii_data, dict) and isinstance(pii_data.get("chunks"), list):
+            per_chunk = pii_data["chunks"]
 
-            # Extract JSON from response (handle cases where GPT adds extra text)
-            json_start = response_text.find('[')
-            json_end = response_text.rfind(']') + 1
+            bin_results = []
+            for i in range(len(chunks)):
+                if i < len(per_chunk):
+                    bin_results.extend(_parse_gemini_items(per_chunk[i]))
 
-            if json_start >= 0 and json_end > json_start:
-                json_text = response_text[json_start:json_end]
-                pii_data = json.loads(json_text)
+            logger.debug("[Gemini] Chunks %s: Found %d PII items", label, len(bin_results))
+            return bin_results
 
-                # Convert to our format and filter by confidence
-                chunk_results = []
-                for item in pii_data:
-                    if isinstance(item, dict) and 'category' in item and 'value' in item:
-                        category = item['category']
-                        value = item['value'].strip()
-                        confidence = item.get('confidence', 0.8)
+        # Fall back to a flat array if the model ignored the object wrapper
+        if isinstance(pii_data, list):
+            bin_results = _parse_gemini_items(pii_data)
+            logger.debug("[Gemini] Chunks %s: Found %d PII items", label, len(bin_results))
+            return bin_results
 
-                        # Only include high-confidence results
-                        if confidence >= 0.7 and value:
-                            chunk_results.append((category, value))
+        if len(chunks) > 1:
+            # Usually a truncated answer; retry the chunks one request at a time
+            logger.warning("Gemini chunks %s: No valid JSON in response, retrying per chunk", label)
+            return _detect_pii_per_chunk(chunks, first_idx, total_chunks, categories_text)
 
-                all_results.extend(chunk_results)
-                print(f"[Gemini] Chunk {chunk_idx + 1}: Found {len(chunk_results)} PII items")
-            else:
-                print(f"[WARN] Gemini chunk {chunk_idx + 1}: No valid JSON in response")
+        logger.warning("Gemini chunks %s: No valid JSON in response", label)
+        return []
 
-        except json.JSONDecodeError as e:
-            print(f"[WARN] Gemini chunk {chunk_idx + 1}: JSON parsing failed: {e}")
-            continue
-        except Exception as e:
-            print(f"[WARN] Gemini chunk {chunk_idx + 1}: Processing failed: {e}")
-            continue
+    except Exception as e:
+        if len(chunks) > 1:
+            # e.g. a safety block or exhausted 429 retries; smaller requests may still succeed
+            logger.warning("Gemini chunks %s: Processing failed, retrying per chunk: %s", label, e)
+            return _detect_pii_per_chunk(chunks, first_idx, total_chunks, categories_text)
+        logger.warning("Gemini chunks %s: Processing failed: %s", label, e)
+        return []
+
+def _detect_pii_per_chunk(chunks: List[str], first_idx: int, total_chunks: int, categories_text: str) -> List[Tuple[str, str]]:
+    """Send each chunk of a bin as its own request, in chunk order"""
+    results = []
+    for offset, chunk in enumerate(chunks):
+        results.extend(_detect_pii_in_bin([chunk], first_idx + offset, total_chunks, categories_text))
+    return results
+
+def extract_pii_with_gemini(text: str, enabled_categories: Optional[List[str]] = None) -> List[Tuple[str, str]]:
+    """
+    Use Gemini to identify PII in text with focus on Malaysian context and intelligent chunking
+
+    Args:
+        text: Text to analyze
+        enabled_categories: List of enabled PII categories
+
+    Returns:
+        List of (label, value) tuples
+    """
+    if not gemini_enabled or not gemini_client:
+        return []
+
+    if not text or len(text.strip()) < 20:  # Minimum meaningful text length
+        return []
 
-    print(f"[Gemini] Total found across all chunks: {len(all_results)} PII items")
+    # Default to all categories if none specified
+    if enabled_categories is None:
+        enabled_categories = _ALL_SELECTABLE
+
+    # Chunk text if it's too long for the LLM, then pack small chunks
+    # together so each request carries several of them
+    text_chunks = chunk_text_intelligently(text, max_chunk_size=3000)
+    chunk_bins = pack_chunks(text_chunks, max_tokens=2500, max_chunks=_MAX_CHUNKS_PER_REQUEST)
+    bin_starts = []
+    start = 0
+    for chunk_bin in chunk_bins:
+        bin_starts.append(start)
+        start += len(chunk_bin)
+    all_results = []
+
+    logger.info("[Gemini] Processing %d text chunks in %d requests", len(text_chunks), len(chunk_bins))
+
+    # Create enhanced category-specific prompt for financial documents
+    enabled_desc = [f"- {cat}: {desc}" for cat, desc in _GEMINI_CATEGORY_DESCRIPTIONS.items() if cat in enabled_categories]
+    categories_text = "\n".join(enabled_desc)
+
+    # Requests are independent network calls, so overlap their latency
+    max_workers = max(1, min(GEMINI_MAX_CONCURRENCY, len(chunk_bins)))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        bin_results = executor.map(
+            _detect_pii_in_bin,
+            chunk_bins,
+            bin_starts,
+            repeat(len(text_chunks)),
+            repeat(categories_text),
+        )
+        for results in bin_results:
+            all_results.extend(results)
+
+    logger.info("[Gemini] Total found across all chunks: %d PII items", len(all_results))
     return all_results
 
 def validate_pii_with_gemini_context(text: str, candidate_pii: List[Tuple[str, str]], enabled_categories: Optional[List[str]] = None) -> List[Tuple[str, str]]:
@@ -245,18 +593,18 @@ def validate_pii_with_gemini_context(text: str, candidate_pii: List[Tuple[str, s
         Filtered list of (label, value) tuples that are truly PII
     """
     if not gemini_enabled or not gemini_client:
-        print("[INFO] Gemini contextual validation skipped (not enabled)")
+        logger.info("Gemini contextual validation skipped (not enabled)")
         return candidate_pii
 
     if not candidate_pii:
-        print("[INFO] No PII candidates to validate")
+        logger.info("No PII candidates to validate")
         return []
 
     if len(text.strip()) < 50:
-        print("[INFO] Text too short for contextual validation")
+        logger.info("Text too short for contextual validation")
         return candidate_pii
 
-    print(f"[Gemini-VALIDATION] Starting contextual validation of {len(candidate_pii)} candidates")
+    logger.info("[Gemini-VALIDATION] Starting contextual validation of %d candidates", len(candidate_pii))
 
     try:
     # Prepare candidate list for Gemini analysis
@@ -315,12 +663,8 @@ Focus on protecting individual privacy while removing corporate/institutional in
             "You are a PII validation expert. Return only valid JSON with items that truly need privacy protection."
         )
         response_text = gemini_client.generate_json(system_prompt, prompt)
-        # Extract JSON from response
-        json_start = response_text.find('[')
-        json_end = response_text.rfind(']') + 1
-        if json_start >= 0 and json_end > json_start:
-            json_text = response_text[json_start:json_end]
-            validated_data = json.loads(json_text)
+        validated_data = _parse_json_response(response_text)
+        if isinstance(validated_data, list):
             # Convert back to our format
             validated_results = []
             for item in validated_data:
@@ -330,7 +674,7 @@ Focus on protecting individual privacy while removing corporate/institutional in
                     reason = item.get('reason', 'Validated by Gemini')
                     if value:
                         validated_results.append((label, value))
-                        print(f"[Gemini-VALIDATION] KEEP: {label} = '{value}' ({reason})")
+                        logger.debug("[Gemini-VALIDATION] KEEP: %s = '%s' (%s)", label, value, reason)
 
             # Show what was filtered out
             original_values = {value.lower() for _, value in candidate_pii}
@@ -338,23 +682,24 @@ Focus on protecting individual privacy while removing corporate/institutional in
             filtered_out = original_values - validated_values
 
             if filtered_out:
-                print(f"[Gemini-VALIDATION] FILTERED OUT: {len(filtered_out)} items")
-                for value in list(filtered_out)[:5]:  # Show first 5
-                    print(f"[Gemini-VALIDATION] REMOVED: '{value}' (document artifact)")
-                if len(filtered_out) > 5:
-                    print(f"[Gemini-VALIDATION] ... and {len(filtered_out) - 5} more")
-
-            print(f"[Gemini-VALIDATION] Final result: {len(validated_results)}/{len(candidate_pii)} candidates validated as true PII")
+                logger.info("[Gemini-VALIDATION] FILTERED OUT: %d items", len(filtered_out))
+                if logger.isEnabledFor(logging.DEBUG):
+                    for value in list(filtered_out)[:5]:  # Show first 5
+                        logger.debug("[Gemini-VALIDATION] REMOVED: '%s' (document artifact)", value)
+                    if len(filtered_out) > 5:
+                        logger.debug("[Gemini-VALIDATION] ... and %d more", len(filtered_out) - 5)
+
+            logger.info("[Gemini-VALIDATION] Final result: %d/%d candidates validated as true PII", len(validated_results), len(candidate_pii))
             return validated_results
         else:
-            print("[WARN] Gemini validation: No valid JSON in response")
+            logger.warning("Gemini validation: No valid JSON in response")
             return candidate_pii
 
     except json.JSONDecodeError as e:
-        print(f"[WARN] Gemini validation JSON parsing failed: {e}")
+        logger.warning("Gemini validation JSON parsing failed: %s", e)
         return candidate_pii
     except Exception as e:
-        print(f"[WARN] Gemini validation failed: {e}")
+        logger.warning("Gemini validation failed: %s", e)
         return candidate_pii
 
 def combine_pii_results(presidio_results: List[Tuple[str, str]],
@@ -377,86 +722,178 @@ def combine_pii_results(presidio_results: List[Tuple[str, str]],
         methods_used.append("NER")
     if gemini_results:
         methods_used.append("Gemini")
-    print(f"[CONSENSUS] Active detection methods: {', '.join(methods_used)}")
+    logger.debug("[CONSENSUS] Active detection methods: %s", ", ".join(methods_used))
     # Combine all results
     all_results = presidio_results + ner_results + gemini_results
     if not all_results:
-        print("[CONSENSUS] No PII detected by any method")
+        logger.debug("[CONSENSUS] No PII detected by any method")
         return []
-    # Group by normalized value for deduplication
-    value_groups = {}
+    # Sets for O(1) source attribution in the consensus loop
+    gemini_set = frozenset(gemini_results)
+    presidio_set = frozenset(presidio_results)
+    # Single pass: normalized value -> label -> [votes, first value, seen from Gemini, seen from Presidio/Regex]
+    value_groups = defaultdict(dict)
     for label, value in all_results:
-        normalized_value = value.strip().lower()
-        if normalized_value not in value_groups:
-            value_groups[normalized_value] = []
-        value_groups[normalized_value].append((label, value))
+        tallies = value_groups[value.strip().lower()]
+        tally = tallies.get(label)
+        if tally is None:
+            tally = tallies[label] = [0, value, False, False]
+        tally[0] += 1
+        # Determine source method (approximate); anything else came from NER
+        candidate = (label, value)
+        if candidate in gemini_set:
+            tally[2] = True
+        elif candidate in presidio_set:
+            tally[3] = True
     # Apply enhanced consensus logic
+    # Priority: Gemini > Presidio/Regex > NER for conflicting labels
     final_results = []
-    for normalized_value, candidates in value_groups.items():
-        if len(candidates) == 1:
-            # Single detection - include it
-            label, value = candidates[0]
-            final_results.append((label, value))
-        else:
-            # Multiple detections - use consensus with priority
-            # Priority: Gemini > Presidio/Regex > NER for conflicting labels
-            label_votes = {}
-            label_sources = {}
-            for label, value in candidates:
-                if label not in label_votes:
-                    label_votes[label] = 0
-                    label_sources[label] = []
-                label_votes[label] += 1
-                # Determine source method (approximate)
-                if (label, value) in gemini_results:
-                    label_sources[label].append("Gemini")
-                elif (label, value) in presidio_results:
-                    label_sources[label].append("Presidio")
-                else:
-                    label_sources[label].append("NER")
-            # Choose best label with priority weighting
-            best_label = None
-            best_score = 0
-            for label, votes in label_votes.items():
-                score = votes
-                # Boost score based on source reliability
-                if "Gemini" in label_sources[label]:
-                    score += 2  # Gemini gets priority for context awareness
-                if "Presidio" in label_sources[label]:
-                    score += 1  # Regex patterns are reliable
-                if score > best_score:
-                    best_score = score
-                    best_label = label
-            # Get the best value (prefer original case)
-            best_value = next(value for label, value in candidates if label == best_label)
-            final_results.append((best_label, best_value))
-
-    print(f"[CONSENSUS] Combined {len(all_results)} detections into {len(final_results)} final results")
+    for tallies in value_groups.values():
+        best_label = None
+        best_score = 0
+        for label, (votes, _, from_gemini, from_presidio) in tallies.items():
+            score = votes
+            # Boost score based on source reliability
+            if from_gemini:
+                score += 2  # Gemini gets priority for context awareness
+            if from_presidio:
+                score += 1  # Regex patterns are reliable
+            if score > best_score:
+                best_score = score
+                best_label = label
+        # Keep the first value seen for the winning label (original case)
+        final_results.append((best_label, tallies[best_label][1]))
+
+    logger.info("[CONSENSUS] Combined %d detections into %d final results", len(all_results), len(final_results))
     return final_results
 
 # === General ignored words (non-sensitive, no encryption required) ===
-IGNORE_WORDS = {
+# Compared against value.strip().lower(), so entries must stay lowercase
+IGNORE_WORDS = frozenset(word.lower() for word in (
     "malaysia", "mykad", "identity", "card", "kad", "pengenalan",
     "warganegara", "lelaki", "perempuan", "bujang", "kawin",
     "lel", "per", "male", "female", "citizen", "not citizen"
-}
+))
+
+# === Precompiled regular expressions ===
+# PII_REGEX_ENGINE=re2 compiles the extractor patterns with google-re2
+# (linear-time, no backtracking); note RE2's \d and \b are ASCII-only
+PII_REGEX_ENGINE = os.getenv("PII_REGEX_ENGINE", "re").lower()
+_regex_backend = re
+if PII_REGEX_ENGINE == "re2":
+    try:
+        import re2 as _regex_backend
+    except ImportError:
+        logger.warning("PII_REGEX_ENGINE=re2 but google-re2 is not installed, using re")
+
+def _compile_pattern(pattern):
+    return _regex_backend.compile(pattern)
+
+# IC, passport and vehicle extractors scan once with a union of their
+# alternatives, whose matches are the same spans the separate scans found;
+# the rest keep separate patterns because their alternatives overlap and
+# each must report its own matches
+def _union(*patterns):
+    return _compile_pattern('|'.join(f'(?:{pattern})' for pattern in patterns))
+
+def _anchored(*patterns):
+    return tuple(_compile_pattern(pattern) for pattern in patterns)
+
+def _with_pattern_votes(matches, alternatives):
+    """
+    Repeat each union match once per alternative that matches all of it
+
+    Separate per-pattern scans reported a token once per pattern (e.g.
+    'A1234567' for two passport patterns), and combine_pii_results counts
+    each report as a vote, so the union keeps that weight.
+    """
+    return [match for match in matches for alternative in alternatives if alternative.fullmatch(match)]
+
+_IC_RE = _union(
+    r"\b\d{6}-\d{2}-\d{4}\b",
+    r"\b\d{12}\b",
+    r"\b\d{6}\s\d{2}\s\d{4}\b",
+)
+_EMAIL_RE = _compile_pattern(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
+_DOB_PATTERNS = tuple(_compile_pattern(p) for p in (
+    r"\b\d{1,2}/\d{1,2}/\d{4}\b",      # DD/MM/YYYY or D/M/YYYY
+    r"\b\d{1,2}-\d{1,2}-\d{4}\b",      # DD-MM-YYYY
+    r"\b\d{4}-\d{1,2}-\d{1,2}\b",      # YYYY-MM-DD
+    r"\b\d{1,2}\s+\w+\s+\d{4}\b",     # DD Month YYYY
+))
+_BANK_ACCOUNT_PATTERNS = tuple(_compile_pattern(p) for p in (
+    r"\b\d{10,16}\b",
+    r"\b\d{4}[-\s]?\d{4}[-\s]?\d{4,8}\b",
+))
+_PHONE_PATTERNS = tuple(_compile_pattern(p) for p in (
+    r'\+60\d{1,2}[-\s]?\d{7,8}',
+    r'\b01\d[-\s]?\d{7,8}\b',
+    r'\b03[-\s]?\d{8}\b',
+    r'\b0[4-9]\d[-\s]?\d{7}\b',
+    r'\b\d{3}[-\s]?\d{7,8}\b',
+))
+_MONEY_RE = _compile_pattern(r'\b(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d{1,2})?\b')
+_GENDER_RE = _compile_pattern(r'(?i)\b(LELAKI|PEREMPUAN|MALE|FEMALE)\b')
+_NATIONALITY_RE = _compile_pattern(r'(?i)\b(WARGANEGARA|WARGA ASING|CITIZEN|NON-CITIZEN)\b')
+_PASSPORT_PATTERNS = (
+    r'\b[A-Z]\d{7,8}\b',      # H12345678 or H1234567
+    r'\b[A-Z]{1,2}\d{6,7}\b', # HK1234567 or A1234567
+    r'\b\d{8,9}[A-Z]\b',      # 12345678A
+)
+_PASSPORT_RE = _union(*_PASSPORT_PATTERNS)
+_PASSPORT_ALTERNATIVES = _anchored(*_PASSPORT_PATTERNS)
+_CC_PATTERNS = tuple(_compile_pattern(p) for p in (
+    r"\b4\d{3}[\s-]?\d{4}[\s-]?\d{4}[\s-]?\d{4}\b",      # Visa
+    r"\b5[1-5]\d{2}[\s-]?\d{4}[\s-]?\d{4}[\s-]?\d{4}\b", # Mastercard
+    r"\b3[47]\d{2}[\s-]?\d{6}[\s-]?\d{5}\b",             # American Express
+    r"\b6(?:011|5\d{2})[\s-]?\d{4}[\s-]?\d{4}[\s-]?\d{4}\b", # Discover
+))
+_ADDRESS_PATTERNS = tuple(_compile_pattern(p) for p in (
+    r"\b\d+[A-Za-z]?,?\s+[A-Za-z\s]+,\s*\d{5}\s+[A-Za-z\s]+\b",
+    r"\b[A-Za-z\s]+,\s*\d{5}\s+[A-Za-z\s]+,\s*[A-Za-z\s]+\b",
+    r"\bNo\.?\s*\d+[A-Za-z]?,?\s+[A-Za-z\s]+,\s*\d{5}\b",
+))
+_VEHICLE_PATTERNS = (
+    r"\b[A-Z]{1,3}\s?\d{1,4}\s?[A-Z]?\b",
+    r"\b[A-Z]{2}\d{4}[A-Z]\b",
+)
+_VEHICLE_RE = _union(*_VEHICLE_PATTERNS)
+# The first pattern covers the second, so every union match is one of its matches
+_VEHICLE_STRICT_RE = _compile_pattern(_VEHICLE_PATTERNS[1])
+# Validation patterns are anchored, so each union matches exactly when one of its alternatives does
+_MOBILE_RE = _union(
+    r'^01[0-9]\d{7,8}$',
+    r'^03\d{8}$',
+    r'^0[4-9]\d{7,8}$',
+)
+_PLATE_RE = _union(
+    r'^[A-Z]{1,3}\d{1,4}[A-Z]?$',
+    r'^[A-Z]{2}\d{4}[A-Z]$',
+)
+
+# Cheap pre-checks: extractors whose patterns all need a digit (or a letter)
+# return early on text without one instead of running every pattern
+_HAS_DIGIT_RE = re.compile(r'\d')
+_HAS_LETTER_RE = re.compile(r'[a-z]', re.I)
+
+# Separator-stripping tables for str.translate; the whitespace set is the
+# same one regex \s matches (all of it lies below U+3001)
+_WHITESPACE = ''.join(chr(code) for code in range(0x3001) if chr(code).isspace())
+_STRIP_WS = str.maketrans('', '', _WHITESPACE)
+_STRIP_SEP = str.maketrans('', '', '-' + _WHITESPACE)
+_STRIP_PHONE_SEP = str.maketrans('', '', '+-' + _WHITESPACE)
 
 # === Enhanced regular expression extractor ===
 def extract_ic(text):
     """Extract Malaysian Identity Card Number"""
-    patterns = [
-        r"\b\d{6}-\d{2}-\d{4}\b", 
-        r"\b\d{12}\b",            
-        r"\b\d{6}\s\d{2}\s\d{4}\b"
-    ]
-    matches = []
-    for pattern in patterns:
-        matches.extend(re.findall(pattern, text))
+    if not text or not _HAS_DIGIT_RE.search(text):
+        return []
+    matches = _IC_RE.findall(text)
 
     # Verify IC number format
     validated_matches = []
     for match in matches:
-        clean_ic = re.sub(r'[-\s]', '', match)
+        clean_ic = match.translate(_STRIP_SEP)
         if len(clean_ic) == 12 and validate_malaysian_ic(clean_ic):
             validated_matches.append(match)
 
@@ -464,294 +901,368 @@ def extract_ic(text):
 
 def extract_email(text):
     """Extract email addresses"""
-    pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-    return re.findall(pattern, text)
+    return _EMAIL_RE.findall(text)
 
 def extract_dob(text):
     """Extract date of birth"""
-    patterns = [
-        r"\b\d{1,2}/\d{1,2}/\d{4}\b",      # DD/MM/YYYY or D/M/YYYY
-        r"\b\d{1,2}-\d{1,2}-\d{4}\b",      # DD-MM-YYYY
-        r"\b\d{4}-\d{1,2}-\d{1,2}\b",      # YYYY-MM-DD
-        r"\b\d{1,2}\s+\w+\s+\d{4}\b",     # DD Month YYYY
-    ]
+    if not text or not _HAS_DIGIT_RE.search(text):
+        return []
     matches = []
-    for pattern in patterns:
-        matches.extend(re.findall(pattern, text))
+    for pattern in _DOB_PATTERNS:
+        matches.extend(pattern.findall(text))
     return matches
 
 def extract_bank_account(text):
     """Retrieve bank account number"""
-    patterns = [
-        r"\b\d{10,16}\b",                 
-        r"\b\d{4}[-\s]?\d{4}[-\s]?\d{4,8}\b",
-    ]
+    if not text or not _HAS_DIGIT_RE.search(text):
+        return []
     matches = []
-    for pattern in patterns:
-        found = re.findall(pattern, text)
+    for pattern in _BANK_ACCOUNT_PATTERNS:
+        found = pattern.findall(text)
         # Filter out matches that might be phone numbers or other numbers
         for match in found:
-            clean_num = re.sub(r'[-\s]', '', match)
+            clean_num = match.translate(_STRIP_SEP)
             if 10 <= len(clean_num) <= 16 and not is_phone_number(clean_num):
                 matches.append(match)
     return matches
 
 def extract_phone(text):
     """Extract phone number (Malaysian format)"""
-    patterns = [
-        r'\+60\d{1,2}[-\s]?\d{7,8}',       
-        r'\b01\d[-\s]?\d{7,8}\b',          
-        r'\b03[-\s]?\d{8}\b',              
-        r'\b0[4-9]\d[-\s]?\d{7}\b',        
-        r'\b\d{3}[-\s]?\d{7,8}\b',         
-    ]
+    if not text or not _HAS_DIGIT_RE.search(text):
+        return []
     matches = []
-    for pattern in patterns:
-        found = re.findall(pattern, text)
+    for pattern in _PHONE_PATTERNS:
+        found = pattern.findall(text)
         for match in found:
             if validate_phone_number(match):
                 matches.append(match)
     return matches
 
 def extract_money(text):
-    pattern = r'\b(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d{1,2})?\b'
-    
-    raw_matches = re.findall(pattern, text)
-    filtered_matches = []
-    seen = set()
-
-    for match in raw_matches:
-        try:
-            normalized = match.replace(',', '')
-            num = float(normalized)
-            if 0.01 <= num <= 10_000_000 and match not in seen:
-                filtered_matches.append(match)
-                seen.add(match)
-        except ValueError:
-            continue
-
-    return filtered_matches
+    if not text or not _HAS_DIGIT_RE.search(text):
+        return []
+    # Deduplicate before parsing; _MONEY_RE only matches strings float() accepts once commas are removed
+    unique_matches = dict.fromkeys(_MONEY_RE.findall(text))
+    return [match for match in unique_matches if 0.01 <= float(match.replace(',', '')) <= 10_000_000]
 
 def extract_gender(text):
-    return re.findall(r'\b(LELAKI|PEREMPUAN|MALE|FEMALE)\b', text, re.I)
+    if not text or not _HAS_LETTER_RE.search(text):
+        return []
+    return _GENDER_RE.findall(text)
 
 def extract_nationality(text):
-    return re.findall(r'\b(WARGANEGARA|WARGA ASING|CITIZEN|NON-CITIZEN)\b', text, re.I)
+    if not text or not _HAS_LETTER_RE.search(text):
+        return []
+    return _NATIONALITY_RE.findall(text)
 
 def extract_passport(text):
+    if not text or not _HAS_DIGIT_RE.search(text):
+        return []
     # Match passport number format: 1 letter + 7 numbers, or similar format
-    patterns = [
-        r'\b[A-Z]\d{7,8}\b',      # H12345678 or H1234567
-        r'\b[A-Z]{1,2}\d{6,7}\b', # HK1234567 or A1234567
-        r'\b\d{8,9}[A-Z]\b'       # 12345678A
-    ]
-    
-    matches = []
-    for pattern in patterns:
-        matches.extend(re.findall(pattern, text))
-    
-    return matches
+    # One scan; a number two patterns accept still counts as two detections
+    return _with_pattern_votes(_PASSPORT_RE.findall(text), _PASSPORT_ALTERNATIVES)
 
 def extract_credit_card(text):
     """Extract credit card numbers"""
-    patterns = [
-        r"\b4\d{3}[\s-]?\d{4}[\s-]?\d{4}[\s-]?\d{4}\b",      # Visa
-        r"\b5[1-5]\d{2}[\s-]?\d{4}[\s-]?\d{4}[\s-]?\d{4}\b", # Mastercard
-        r"\b3[47]\d{2}[\s-]?\d{6}[\s-]?\d{5}\b",             # American Express
-        r"\b6(?:011|5\d{2})[\s-]?\d{4}[\s-]?\d{4}[\s-]?\d{4}\b", # Discover
-    ]
+    if not text or not _HAS_DIGIT_RE.search(text):
+        return []
     matches = []
-    for pattern in patterns:
-        found = re.findall(pattern, text)
+    for pattern in _CC_PATTERNS:
+        found = pattern.findall(text)
         for match in found:
-            clean_cc = re.sub(r'[\s-]', '', match)
+            clean_cc = match.translate(_STRIP_SEP)
             if validate_credit_card(clean_cc):
                 matches.append(match)
     return matches
 
 def extract_malaysian_address(text):
     """Extract Malaysia Address"""
-    patterns = [
-        r"\b\d+[A-Za-z]?,?\s+[A-Za-z\s]+,\s*\d{5}\s+[A-Za-z\s]+\b",
-        r"\b[A-Za-z\s]+,\s*\d{5}\s+[A-Za-z\s]+,\s*[A-Za-z\s]+\b",
-        r"\bNo\.?\s*\d+[A-Za-z]?,?\s+[A-Za-z\s]+,\s*\d{5}\b",   
-    ]
+    if not text or not _HAS_DIGIT_RE.search(text):
+        return []
     matches = []
-    for pattern in patterns:
-        matches.extend(re.findall(pattern, text))
+    for pattern in _ADDRESS_PATTERNS:
+        matches.extend(pattern.findall(text))
     return matches
 
 def extract_vehicle_registration(text):
     """Extract license plate number"""
-    patterns = [
-        r"\b[A-Z]{1,3}\s?\d{1,4}\s?[A-Z]?\b",
-        r"\b[A-Z]{2}\d{4}[A-Z]\b",            
-    ]
-    matches = []
-    for pattern in patterns:
-        found = re.findall(pattern, text)
-        for match in found:
-            if validate_vehicle_plate(match):
-                matches.append(match)
-    return matches
+    if not text or not _HAS_DIGIT_RE.search(text):
+        return []
+    matches = [match for match in _VEHICLE_RE.findall(text) if validate_vehicle_plate(match)]
+    # Plates the strict pattern also accepts were reported by both patterns, so count them twice
+    return matches + [match for match in matches if _VEHICLE_STRICT_RE.fullmatch(match)]
 
 # === Validation Function ===
+# Days per month for the IC date-of-birth check (February adjusted for leap years)
+_DAYS_IN_MONTH = (31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+def _is_leap_year(year: int) -> bool:
+    return (year % 4 == 0 and year % 100 != 0) or year % 400 == 0
+
 def validate_malaysian_ic(ic_number: str) -> bool:
-    if len(ic_number) != 12 or not ic_number.isdigit():
+    # isdecimal() also rejects digit-like characters that int() cannot parse
+    if len(ic_number) != 12 or not ic_number.isdecimal():
         return False
 
-    try:
-        # Verify that the date of birth is legitimate
-        year = int(ic_number[:2])
-        month = int(ic_number[2:4])
-        day = int(ic_number[4:6])
-        full_year = 2000 + year if year <= 30 else 1900 + year
-        datetime(full_year, month, day)
-    except ValueError:
+    # Verify that the date of birth is legitimate
+    return _is_valid_ic_date(ic_number[:6])
+
+@functools.lru_cache(maxsize=4096)
+def _is_valid_ic_date(yymmdd: str) -> bool:
+    """Check the YYMMDD birth date of an IC number; cached since documents repeat the same ICs"""
+    year = int(yymmdd[:2])
+    month = int(yymmdd[2:4])
+    day = int(yymmdd[4:6])
+    if not 1 <= month <= 12:
         return False
-    return True
+    full_year = 2000 + year if year <= 30 else 1900 + year
+    days_in_month = _DAYS_IN_MONTH[month - 1] + (1 if month == 2 and _is_leap_year(full_year) else 0)
+    return 1 <= day <= days_in_month
+
+# Digit sum of 2*d for each digit d, as used by the Luhn algorithm
+_LUHN_DOUBLED = (0, 2, 4, 6, 8, 1, 3, 5, 7, 9)
 
 def validate_credit_card(cc_number):
     """Validating credit card numbers using the Luhn algorithm"""
-    def luhn_checksum(card_num):
-        def digits_of(n):
-            return [int(d) for d in str(n)]
-        digits = digits_of(card_num)
-        odd_digits = digits[-1::-2]
-        even_digits = digits[-2::-2]
-        checksum = sum(odd_digits)
-        for d in even_digits:
-            checksum += sum(digits_of(d*2))
-        return checksum % 10
-    return luhn_checksum(cc_number) == 0
+    digits = list(map(int, str(cc_number)))
+    checksum = sum(digits[-1::-2]) + sum(_LUHN_DOUBLED[d] for d in digits[-2::-2])
+    return checksum % 10 == 0
 
 def validate_phone_number(phone):
     """Validate phone number format"""
-    clean_phone = re.sub(r'[\s+\-]', '', phone)
+    clean_phone = phone.translate(_STRIP_PHONE_SEP)
 
     # Malaysia Mobile Number Verification
     if clean_phone.startswith('60'):
         clean_phone = clean_phone[2:]
 
     # mobile patterns
-    mobile_patterns = [
-        r'^01[0-9]\d{7,8}$',
-        r'^03\d{8}$',      
-        r'^0[4-9]\d{7,8}$',
-    ]
-
-    for pattern in mobile_patterns:
-        if re.match(pattern, clean_phone):
-            return True
-
-    return False
+    return _MOBILE_RE.match(clean_phone) is not None
 
 def validate_vehicle_plate(plate):
     """Verify license plate number format"""
-    clean_plate = re.sub(r'\s', '', plate.upper())
+    clean_plate = plate.upper().translate(_STRIP_WS)
 
     # Malaysian license plate format
-    patterns = [
-        r'^[A-Z]{1,3}\d{1,4}[A-Z]?$',\
-        r'^[A-Z]{2}\d{4}[A-Z]$',       
-    ]
-
-    for pattern in patterns:
-        if re.match(pattern, clean_plate):
-            return True
-
-    return False
+    return _PLATE_RE.match(clean_plate) is not None
 
 def is_phone_number(number_str):
     """Check if a numeric string is possibly a phone number"""
-    clean_num = re.sub(r'[\s-]', '', number_str)
-    return len(clean_num) in [10, 11, 12] and (clean_num.startswith('01') or clean_num.startswith('03'))
+    clean_num = number_str.translate(_STRIP_SEP)
+    return 10 <= len(clean_num) <= 12 and clean_num[:2] in ('01', '03')
 
 # === Malaysia location whitelist (to prevent accidental merging) ===
-MALAYSIA_LOCATIONS = {
+MALAYSIA_LOCATIONS = frozenset({
     "KUALA LUMPUR", "PETALING JAYA", "SELANGOR", "JOHOR", "JOHOR BAHRU",
     "PENANG", "GEORGETOWN", "ALOR SETAR", "KELANTAN", "TERENGGANU",
     "MELAKA", "KUCHING", "KOTA KINABALU", "LABUAN", "SABAH", "SARAWAK"
+})
+
+# === Precompiled dictionary patterns (one alternation per category) ===
+def _is_word_char(ch):
+    return ch.isalnum() or ch == '_'
+
+def _at_word_boundary(text, index):
+    """Same test as the regex word boundary at position index"""
+    before = index > 0 and _is_word_char(text[index - 1])
+    after = index < len(text) and _is_word_char(text[index])
+    return before != after
+
+def _word_boundary_ok(text, start, end):
+    return _at_word_boundary(text, start) and _at_word_boundary(text, end)
+
+def _contains_word(outer, inner):
+    """Whether inner occurs in outer as a whole word; the edges of outer count as boundaries"""
+    start = outer.find(inner)
+    while start >= 0:
+        end = start + len(inner)
+        if (start == 0 or _at_word_boundary(outer, start)) and (end == len(outer) or _at_word_boundary(outer, end)):
+            return True
+        start = outer.find(inner, start + 1)
+    return False
+
+def _compile_dictionary(entries):
+    """
+    Fold a dictionary into a single whole-word regex, a lowercase -> original
+    map and a map from each entry to the shorter entries nested inside it
+    """
+    originals = {entry.lower(): entry for entry in entries}
+    # Longest entries first so the alternation prefers the longest match;
+    # the lookahead tries every position, so overlapping entries are all found
+    alternation = '|'.join(re.escape(entry) for entry in sorted(originals, key=len, reverse=True))
+    pattern = re.compile(r'(?=\b(' + alternation + r')\b)')
+    # A match consumes the entries nested in it (e.g. 'pending' in 'pending approval'),
+    # so they are added back from this map
+    nested = {
+        outer: tuple(inner for inner in originals if inner != outer and _contains_word(outer, inner))
+        for outer in originals
+    }
+    return pattern, originals, nested
+
+_DICTIONARY_RE = {
+    category: _compile_dictionary(entries)
+    for category, entries in (
+        ("NAMES", NAMES),
+        ("ORG_NAMES", ORG_NAMES),
+        ("RACES", RACES),
+        ("STATUS", STATUS),
+        ("RELIGIONS", RELIGIONS),
+    )
 }
 
-def extract_from_dictionaries(text, enabled_categories=None):
+# Locations use substring matching, so only their lowercase forms are precomputed
+_LOCATIONS_LOWER = [(location.lower(), location) for location in LOCATIONS]
+
+# No dictionary entry can match text shorter than this
+_MIN_DICT_LEN = min(
+    len(entry.lower())
+    for entries in (NAMES, ORG_NAMES, RACES, STATUS, LOCATIONS, RELIGIONS)
+    for entry in entries
+)
+
+def _match_dictionary(category, text_lower):
+    """Return the original-case dictionary entries of a category found in text_lower"""
+    pattern, originals, nested = _DICTIONARY_RE[category]
+    found = {}
+    for match in pattern.findall(text_lower):
+        found[match] = None
+        found.update(dict.fromkeys(nested[match]))
+    return [originals[match] for match in found]
+
+def _match_locations(text_lower):
+    """Return the locations found in text_lower"""
+    # Locations may contain special characters, use a looser substring match
+    return [location for location_lower, location in _LOCATIONS_LOWER if location_lower in text_lower]
+
+# Dictionary matchers in priority order
+_DICTIONARY_MATCHERS = (
+    ("NAMES", functools.partial(_match_dictionary, "NAMES")),          # 1. Full name matching (highest priority)
+    ("ORG_NAMES", functools.partial(_match_dictionary, "ORG_NAMES")),  # 2. Full organization name matching
+    ("RACES", functools.partial(_match_dictionary, "RACES")),          # 3. Race Matching
+    ("STATUS", functools.partial(_match_dictionary, "STATUS")),        # 4. State Matching
+    ("LOCATIONS", _match_locations),                                   # 5. Location Matching
+    ("RELIGIONS", functools.partial(_match_dictionary, "RELIGIONS")),  # 6. Religious Match
+)
+
+# === Optional Aho-Corasick automaton over every dictionary ===
+def _build_dictionary_automaton(categories=None):
+    """Add every dictionary entry of the given categories (all if None), tagged by category, to a single automaton"""
+    tagged = {}
+    for category, (pattern, originals, nested) in _DICTIONARY_RE.items():
+        if categories is not None and category not in categories:
+            continue
+        for entry_lower, entry in originals.items():
+            tagged.setdefault(entry_lower, []).append((category, entry, True))
+    if categories is None or "LOCATIONS" in categories:
+        for location_lower, location in _LOCATIONS_LOWER:
+            # Locations keep their substring semantics, so no boundary check
+            tagged.setdefault(location_lower, []).append(("LOCATIONS", location, False))
+
+    automaton = ahocorasick.Automaton()
+    for entry_lower, entries in tagged.items():
+        automaton.add_word(entry_lower, (len(entry_lower), tuple(entries)))
+    automaton.make_automaton()
+    return automaton
+
+_DICT_AUTOMATON = _build_dictionary_automaton() if AHOCORASICK_ENABLED else None
+
+@functools.lru_cache(maxsize=32)
+def _make_dict_extractor(enabled_categories):
+    """Build a dictionary extractor that only runs the matchers of the given frozenset of categories"""
+    matchers = tuple(
+        (category, matcher) for category, matcher in _DICTIONARY_MATCHERS if category in enabled_categories
+    )
+
+    if _DICT_AUTOMATON is not None:
+        categories = tuple(category for category, _ in matchers)
+        # A subset gets its own smaller automaton, so disabled entries are never reported or checked
+        automaton = (
+            _DICT_AUTOMATON if len(categories) == len(_DICTIONARY_MATCHERS)
+            else _build_dictionary_automaton(frozenset(categories))
+        )
+
+        def extract(text_lower):
+            # One linear scan finds every entry of every category
+            found = {category: {} for category in categories}
+            for end, (length, entries) in automaton.iter(text_lower):
+                start = end - length + 1
+                for category, value, bounded in entries:
+                    if category in found and (not bounded or _word_boundary_ok(text_lower, start, end + 1)):
+                        found[category][value] = None
+            return [(category, value) for category in categories for value in found[category]]
+
+        return extract
+
+    def extract(text_lower):
+        results = []
+        for category, matcher in matchers:
+            results.extend((category, value) for value in matcher(text_lower))
+        return results
+
+    return extract
+
+_DICTIONARY_CATEGORIES = frozenset(category for category, _ in _DICTIONARY_MATCHERS)
+
+# Recent dictionary results keyed by (digest of the lowercased text, categories);
+# the digest keeps whole documents out of the cache
+_DICT_CACHE_SIZE = 256
+_dict_cache = OrderedDict()
+_dict_cache_lock = threading.Lock()
+
+def clear_dictionary_cache():
+    """Drop memoized dictionary results and extractors (call after the dictionaries change)"""
+    with _dict_cache_lock:
+        _dict_cache.clear()
+    _make_dict_extractor.cache_clear()
+
+def extract_from_dictionaries(text, enabled_categories=None, text_lower=None):
     """
     Extracts PII from a dictionary, supporting selective category filtering
 
     Args:
         text: The text to be analyzed
         enabled_categories: A list of enabled selective PII categories
+        text_lower: Optional precomputed text.lower(), reused instead of lowercasing again
 
     Returns:
         list: [(label, value), ...] 
     """
     if enabled_categories is None:
-        enabled_categories = list(SELECTABLE_PII_CATEGORIES.keys())
+        enabled_categories = _ALL_SELECTABLE
+    else:
+        enabled_categories = frozenset(enabled_categories)
 
-    print(f"[DEBUG] 字典提取，启用类别: {enabled_categories}")
-    print("[DEBUG] 原始文本：", text)
+    logger.debug("字典提取，启用类别: %s", sorted(enabled_categories))
 
-    results = []
-    text_lower = text.lower()
+    # Nothing to match when no dictionary category is enabled
+    if enabled_categories.isdisjoint(_DICTIONARY_CATEGORIES):
+        return []
 
-    # 1. Full name matching (highest priority)
-    if "NAMES" in enabled_categories:
-        for name in NAMES:
-            if name.lower() in text_lower:
-                # Make sure it matches the entire word, not a partial one
-                pattern = r'\b' + re.escape(name.lower()) + r'\b'
-                if re.search(pattern, text_lower):
-                    results.append(("NAMES", name))
-                    print(f"[DEBUG] Find full name: {name}")
-
-    # 2. Full organization name matching
-    if "ORG_NAMES" in enabled_categories:
-        for org in ORG_NAMES:
-            if org.lower() in text_lower:
-                pattern = r'\b' + re.escape(org.lower()) + r'\b'
-                if re.search(pattern, text_lower):
-                    results.append(("ORG_NAMES", org))
-                    print(f"[DEBUG] Find the organization name: {org}")
-
-    # 3. Race Matching
-    if "RACES" in enabled_categories:
-        for race in RACES:
-            if race.lower() in text_lower:
-                pattern = r'\b' + re.escape(race.lower()) + r'\b'
-                if re.search(pattern, text_lower):
-                    results.append(("RACES", race))
-                    print(f"[DEBUG] Find the race: {race}")
-
-    # 4. State Matching
-    if "STATUS" in enabled_categories:
-        for status in STATUS:
-            if status.lower() in text_lower:
-                pattern = r'\b' + re.escape(status.lower()) + r'\b'
-                if re.search(pattern, text_lower):
-                    results.append(("STATUS", status))
-                    print(f"[DEBUG] Found status: {status}")
-
-    # 5. Location Matching
-    if "LOCATIONS" in enabled_categories:
-        for location in LOCATIONS:
-            if location.lower() in text_lower:
-                # Locations may contain special characters, use a looser match
-                if location.lower() in text_lower:
-                    results.append(("LOCATIONS", location))
-                    print(f"[DEBUG] Find the location: {location}")
-
-    # 6. Religious Match
-    if "RELIGIONS" in enabled_categories:
-        for religion in RELIGIONS:
-            if religion.lower() in text_lower:
-                pattern = r'\b' + re.escape(religion.lower()) + r'\b'
-                if re.search(pattern, text_lower):
-                    results.append(("RELIGIONS", religion))
-                    print(f"[DEBUG] Find religion: {religion}")
-
-    print(f"[DEBUG] Dictionary matching results: Found {len(results)} PII items")
-    for label, value in results:
-        print(f"[DEBUG]   - {label}: {value}")
+    if text_lower is None:
+        text_lower = text.lower()
+
+    cache_key = (
+        hashlib.blake2b(text_lower.encode('utf-8', 'surrogatepass'), digest_size=16).digest(),
+        enabled_categories,
+    )
+    with _dict_cache_lock:
+        cached = _dict_cache.get(cache_key)
+        if cached is not None:
+            _dict_cache.move_to_end(cache_key)
+
+    if cached is None:
+        cached = tuple(_make_dict_extractor(enabled_categories)(text_lower))
+        with _dict_cache_lock:
+            _dict_cache[cache_key] = cached
+            while len(_dict_cache) > _DICT_CACHE_SIZE:
+                _dict_cache.popitem(last=False)
+
+    results = list(cached)
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Dictionary matching results: Found %d PII items", len(results))
+        for label, value in results:
+            logger.debug("  - %s: %s", label, value)
     return results
 
 # ✅ Optional PII Category Definitions
@@ -763,6 +1274,7 @@ SELECTABLE_PII_CATEGORIES = {
     "LOCATIONS": "Geographic locations and addresses",
     "RELIGIONS": "Religious affiliations"
 }
+_ALL_SELECTABLE = frozenset(SELECTABLE_PII_CATEGORIES)
 
 # ✅ Non-selective PII categories (always masked)
 NON_SELECTABLE_PII_CATEGORIES = {
@@ -778,194 +1290,315 @@ NON_SELECTABLE_PII_CATEGORIES = {
     "Vehicle Registration": "Vehicle registration numbers"
 }
 
-# ✅ Main function: Extract all PII (with selective filtering + Gemini enhancement)
-def extract_all_pii(text, enabled_categories=None):
+# Regex extractors run on every document, in this order
+_EXTRACTORS = (
+    ("IC", extract_ic),
+    ("Email", extract_email),
+    ("DOB", extract_dob),
+    ("Bank Account", extract_bank_account),
+    ("Passport", extract_passport),
+    ("Phone", extract_phone),
+    ("Money", extract_money),
+    ("Gender", extract_gender),
+    ("Nationality", extract_nationality),
+    ("Credit Card", extract_credit_card),
+    ("Address", extract_malaysian_address),
+    ("Vehicle Registration", extract_vehicle_registration),
+)
+
+# Threads that run the extractors of one document side by side (0 or 1 runs them inline).
+# Stdlib re holds the GIL while matching, so this only helps with PII_REGEX_ENGINE=re2
+PII_EXTRACTOR_WORKERS = int(os.getenv("PII_EXTRACTOR_WORKERS", "0"))
+_extractor_pool = (
+    ThreadPoolExecutor(max_workers=PII_EXTRACTOR_WORKERS, thread_name_prefix="pii-extract")
+    if PII_EXTRACTOR_WORKERS > 1 else None
+)
+
+def _run_extractor(extractor, text):
+    label, func = extractor
+    return [(label, match.strip()) for match in func(text)]
+
+# === NER helpers ===
+NER_MAX_TOKENS = 300  # Conservative limit for NER model (model limit is ~512 tokens)
+NER_MAX_SUBWORDS = 500  # Sub-word budget per chunk, leaving room for special tokens
+NER_BATCH_SIZE = 32
+
+def _ner_chunks(text, max_tokens=NER_MAX_TOKENS, tokenizer=None):
     """
-    Extract PII, support selective category filtering, and integrate Gemini enhanced detection
-
-    Args:
-        text: Text to analyze
-        enabled_categories: A list of selective PII categories to enable, such as ["NAMES", "RACES"]
-                If None, all categories are enabled.
+    Split text into chunks short enough for the NER model
 
-    Returns:
-        list: PII实体列表 [(label, value), ...]
+    With a fast tokenizer the chunks are cut by sub-word count, so words that
+    expand into many pieces cannot push a chunk past the model limit;
+    otherwise they are cut every max_tokens whitespace words.
     """
-    # If not specified, all optional categories are enabled by default.
-    if enabled_categories is None:
-        enabled_categories = list(SELECTABLE_PII_CATEGORIES.keys())
+    words = text.split()
+    if not getattr(tokenizer, "is_fast", False):
+        if len(words) <= max_tokens:
+            return [text]
+        return [" ".join(words[i:i + max_tokens]) for i in range(0, len(words), max_tokens)]
+
+    # Count sub-words per word with one tokenizer call over the whole document
+    word_ids = tokenizer(words, is_split_into_words=True, add_special_tokens=False).word_ids()
+    counts = [0] * len(words)
+    for word_id in word_ids:
+        if word_id is not None:
+            counts[word_id] += 1
+    if sum(counts) <= NER_MAX_SUBWORDS:
+        return [text]
 
-    # Initialize Gemini client if not already done
-    if not gemini_enabled:
-        load_gemini_client()
+    chunks = []
+    start = 0
+    budget = 0
+    for i, count in enumerate(counts):
+        if budget + count > NER_MAX_SUBWORDS and i > start:
+            chunks.append(" ".join(words[start:i]))
+            start = i
+            budget = 0
+        budget += count
+    chunks.append(" ".join(words[start:]))
+    return chunks
 
-    print(f"[INFO] PII detection started - Enabled categories: {enabled_categories}")
-    print(f"[INFO] Detection methods: NER + Regex + Dictionary + {'Gemini' if gemini_enabled else 'No Gemini'}")
+def _stitch_ner_tokens(ner_raw_results):
+    """Merge raw BIO sub-word tokens from the NER pipeline into (label, word) entities"""
+    # Aggregating pipelines (NER_AGGREGATION) already return whole entities
+    if ner_raw_results and "entity_group" in ner_raw_results[0]:
+        return [(ent["entity_group"], ent["word"].strip()) for ent in ner_raw_results]
 
-    presidio_regex_results = []
     ner_results = []
-    gemini_results = []
-
-    # --- 1. NER extraction (fine-grained) with token limit handling ---
-    try:
-        # Load model if not already loaded
-        if not model_loaded:
-            load_model()
-
-        if ner_pipeline is not None:
-            # Handle token limit by chunking text for NER
-            text_length = len(text.split())
-            max_tokens = 300  # Conservative limit for NER model (model limit is ~512 tokens)
-
-            if text_length > max_tokens:
-                print(f"[NER] Text too long ({text_length} tokens), chunking for NER processing...")
-                # Split text into smaller chunks for NER
-                words = text.split()
-                chunk_size = max_tokens
-                ner_raw_results = []
-
-                for i in range(0, len(words), chunk_size):
-                    chunk_words = words[i:i + chunk_size]
-                    chunk_text = " ".join(chunk_words)
-
-                    # Additional safety check - if chunk is still too long, skip it
-                    if len(chunk_text.split()) > max_tokens:
-                        print(f"[WARN] NER chunk {i//chunk_size + 1} still too long, skipping")
-                        continue
-
-                    try:
-                        chunk_results = ner_pipeline(chunk_text)
-                        ner_raw_results.extend(chunk_results)
-                        print(f"[NER] Processed chunk {i//chunk_size + 1}: {len(chunk_results)} entities")
-                    except Exception as chunk_e:
-                        print(f"[WARN] NER chunk {i//chunk_size + 1} failed: {chunk_e}")
-                        continue
-            else:
-                ner_raw_results = ner_pipeline(text)
+    append = ner_results.append
+
+    # Flatten the raw tokens into parallel lists (word, entity, new-word flag)
+    words, entities, new_flags = [], [], []
+    for ent in ner_raw_results:
+        word = ent["word"]
+        entity = ent["entity"]
+        entities.append(entity[2:] if entity[:2] in ("B-", "I-") else entity)
+        # Only "##" marks a continuation; "▁"-prefixed and bare tokens start a new word
+        new_flags.append(not word.startswith("##"))
+        words.append(word.replace("##", "").replace("▁", ""))
+
+    current_word = ""
+    current_label = ""
+
+    for word, entity, is_new_word in zip(words, entities, new_flags):
+        # If it is a new word, end the current word
+        if current_label and is_new_word:
+            if current_word:
+                append((current_label, current_word))
+            current_word = word
+            current_label = entity
+        # If it is a continuation (starting with ## or ), and the entity types are the same, then concatenate
+        elif current_label == entity:
+            current_word += word
+        # Different types, end the old one first, then start the new one
         else:
-            print("[WARN] NER model not available, using regex-only detection")
-            ner_raw_results = []
-        tokens = []
-        for ent in ner_raw_results:
-            word = ent["word"]
-            entity = ent["entity"].replace("B-", "").replace("I-", "")
-            # Determine whether it is the beginning of a new word
-            is_new_word = word.startswith("▁") or (not word.startswith("##") and not word.startswith("▁"))
-            clean_word = word.replace("##", "").replace("▁", "")
-            tokens.append({
-                "word": clean_word,
-                "entity": entity,
-                "is_new_word": is_new_word
-            })
-
-        current_word = ""
-        current_label = ""
-
-        for tok in tokens:
-            # If it is a new word, end the current word
-            if current_label and tok["is_new_word"]:
-                if current_word:
-                    ner_results.append((current_label, current_word))
-                current_word = tok["word"]
-                current_label = tok["entity"]
-            # If it is a continuation (starting with ## or ), and the entity types are the same, then concatenate
-            elif current_label == tok["entity"]:
-                current_word += tok["word"]
-            # Different types, end the old one first, then start the new one
-            else:
-                if current_word:
-                    ner_results.append((current_label, current_word))
-                current_word = tok["word"]
-                current_label = tok["entity"]
+            if current_word:
+                append((current_label, current_word))
+            current_word = word
+            current_label = entity
 
-        # End the last one
-        if current_word:
-            ner_results.append((current_label, current_word))
+    # End the last one
+    if current_word:
+        append((current_label, current_word))
 
-        print(f"[NER] Found {len(ner_results)} entities")
+    return ner_results
 
-    except Exception as e:
-        print(f"[WARN] NER extraction failed: {e}")
-    print("[INFO] Continuing with regex and Gemini detection methods")
+def _run_ner_batch(ner, texts):
+    """
+    Run NER over several documents with one batched pipeline call
 
-    # --- 2. Enhanced regular rule supplement ---
-    extractors = {
-        "IC": extract_ic,
-        "Email": extract_email,
-        "DOB": extract_dob,
-        "Bank Account": extract_bank_account,
-        "Passport": extract_passport,
-        "Phone": extract_phone,
-        "Money": extract_money,
-        "Gender": extract_gender,
-        "Nationality": extract_nationality,
-        "Credit Card": extract_credit_card,
-        "Address": extract_malaysian_address,
-        "Vehicle Registration": extract_vehicle_registration,
-    }
+    Args:
+        ner: Loaded NER pipeline, or None if unavailable
+        texts: Documents to analyze
+
+    Returns:
+        list: One [(label, word), ...] list per document
+    """
+    if ner is None:
+        return [[] for _ in texts]
 
-    print(f"[INFO] Start regular extraction, total {len(extractors)} PII types")
+    # Chunk every document and remember which document each chunk belongs to
+    chunks = []
+    owners = []
+    tokenizer = getattr(ner, "tokenizer", None)
+    for doc_idx, text in enumerate(texts):
+        doc_chunks = _ner_chunks(text, tokenizer=tokenizer)
+        if len(doc_chunks) > 1:
+            logger.debug("[NER] Document %d too long, split into %d chunks for NER processing", doc_idx + 1, len(doc_chunks))
+        chunks.extend(doc_chunks)
+        owners.extend([doc_idx] * len(doc_chunks))
+
+    raw_by_doc = [[] for _ in texts]
+    try:
+        # Feed chunks shortest-first so each padded batch holds similar lengths,
+        # then restore the original order before grouping by document
+        order = sorted(range(len(chunks)), key=lambda i: len(chunks[i]))
+        batch_results = [None] * len(chunks)
+        for i, chunk_results in zip(order, ner([chunks[i] for i in order], batch_size=NER_BATCH_SIZE)):
+            batch_results[i] = chunk_results
+        for doc_idx, chunk_results in zip(owners, batch_results):
+            raw_by_doc[doc_idx].extend(chunk_results)
+    except Exception as e:
+        # Retry chunk by chunk so one bad chunk does not drop the whole batch
+        logger.warning("Batched NER failed (%s), retrying chunk by chunk", e)
+        raw_by_doc = [[] for _ in texts]
+        for chunk_idx, (doc_idx, chunk) in enumerate(zip(owners, chunks)):
+            try:
+                raw_by_doc[doc_idx].extend(ner(chunk))
+            except Exception as chunk_e:
+                logger.warning("NER chunk %d failed: %s", chunk_idx + 1, chunk_e)
+
+    return [_stitch_ner_tokens(raw) for raw in raw_by_doc]
+
+def _extract_document_pii(text, enabled_categories, ner_results):
+    """Run the regex, dictionary and Gemini stages for one document and merge them with its NER results"""
+    presidio_regex_results = []
+    gemini_results = []
+    text_lower = text.lower()
+    stripped_len = len(text.strip())
 
-    for label, func in extractors.items():
-        matches = func(text)
-        for match in matches:
-            presidio_regex_results.append((label, match.strip()))
+    # --- 2. Enhanced regular rule supplement ---
+    logger.debug("Start regular extraction, total %d PII types", len(_EXTRACTORS))
 
     # --- 3. Dictionary matching supplement (selective filtering) ---
-    dict_results = extract_from_dictionaries(text, enabled_categories)
-    for label, value in dict_results:
-        presidio_regex_results.append((label, value))
+    # Skip entirely when the text is shorter than the shortest dictionary entry
+    run_dictionaries = len(text_lower) >= _MIN_DICT_LEN
+
+    if _extractor_pool is not None:
+        # Dictionary matching runs alongside the regex extractors; results keep the sequential order
+        dict_future = (
+            _extractor_pool.submit(extract_from_dictionaries, text, enabled_categories, text_lower)
+            if run_dictionaries else None
+        )
+        for matches in _extractor_pool.map(_run_extractor, _EXTRACTORS, repeat(text)):
+            presidio_regex_results.extend(matches)
+        if dict_future is not None:
+            presidio_regex_results.extend(dict_future.result())
+    else:
+        for extractor in _EXTRACTORS:
+            presidio_regex_results.extend(_run_extractor(extractor, text))
+        if run_dictionaries:
+            presidio_regex_results.extend(extract_from_dictionaries(text, enabled_categories, text_lower))
 
-    print(f"[PRESIDIO/REGEX] Found {len(presidio_regex_results)} entities")
+    logger.info("[PRESIDIO/REGEX] Found %d entities", len(presidio_regex_results))
 
     # --- 4. Gemini Enhanced Detection ---
-    if gemini_enabled and len(text.strip()) >= 20:  # Use LLM for meaningful text
-        print("[INFO] Starting Gemini enhanced detection...")
+    if gemini_enabled and stripped_len >= 20:  # Use LLM for meaningful text
+        logger.debug("Starting Gemini enhanced detection...")
         gemini_results = extract_pii_with_gemini(text, enabled_categories)
-        print(f"[Gemini] Found {len(gemini_results)} entities")
+        logger.info("[Gemini] Found %d entities", len(gemini_results))
     else:
         if not gemini_enabled:
-            print("[INFO] Gemini detection skipped (not enabled)")
+            logger.debug("Gemini detection skipped (not enabled)")
         else:
-            print(f"[INFO] Gemini detection skipped (text too short: {len(text.strip())} chars < 20)")
+            logger.debug("Gemini detection skipped (text too short: %d chars < 20)", stripped_len)
 
     # --- 5. Result merging and consensus mechanism (Stage 1 Complete) ---
-    print("[INFO] Stage 1: Apply consensus mechanism to merge test results...")
+    logger.debug("Stage 1: Apply consensus mechanism to merge test results...")
     stage1_results = combine_pii_results(presidio_regex_results, ner_results, gemini_results)
 
     # --- 6. Deduplication + Filtering Non-sensitive Words (Stage 1 Filtering) ---
-    seen = set()
-    stage1_filtered = []
+    # Keyed by normalized value; dict insertion order keeps the first occurrence
+    unique_results = {}
     for label, value in stage1_results:
-        clean_val = value.strip().lower()
-        # Skipping empty values and ignoring words
-        if not clean_val or clean_val in IGNORE_WORDS:
+        stripped = value.strip()
+        clean_val = stripped.lower()
+        # Skipping empty values, ignored words and duplicates
+        if not clean_val or clean_val in IGNORE_WORDS or clean_val in unique_results:
             continue
-        if clean_val not in seen:
-            seen.add(clean_val)
-            stage1_filtered.append((label, value.strip()))  # Keep original case
+        unique_results[clean_val] = (label, stripped)  # Keep original case
+    stage1_filtered = list(unique_results.values())
 
-    print(f"[STAGE-1] Initially detected {len(stage1_filtered)} PII candidates")
+    logger.info("[STAGE-1] Initially detected %d PII candidates", len(stage1_filtered))
 
     # --- 7. Stage 2: Gemini Contextual Validation (ADDITIVE, not filtering) ---
-    if len(stage1_filtered) > 0 and len(text.strip()) >= 100:  # Only for substantial documents
-        print("[INFO] Stage 2: Starting Gemini contextual validation...")
+    if len(stage1_filtered) > 0 and stripped_len >= 100:  # Only for substantial documents
+        logger.debug("Stage 2: Starting Gemini contextual validation...")
         gemini_validated = validate_pii_with_gemini_context(text, stage1_filtered, enabled_categories)
 
         # Calculate filtering statistics for logging
         filtered_count = len(stage1_filtered) - len(gemini_validated)
         if filtered_count > 0:
-            print(f"[STAGE-2] Gemini validation: {len(gemini_validated)}/{len(stage1_filtered)} items passed validation")
+            logger.info("[STAGE-2] Gemini validation: %d/%d items passed validation", len(gemini_validated), len(stage1_filtered))
         else:
-            print(f"[STAGE-2] Gemini validation: All candidates passed validation")
+            logger.info("[STAGE-2] Gemini validation: All candidates passed validation")
 
         # IMPORTANT: Use ALL Stage 1 results, not just Gemini-validated ones
         # This ensures comprehensive PII protection while benefiting from Gemini's accuracy insights
         final_results = stage1_filtered
-        print(f"[STAGE-2] Retaining all Stage 1 detection results to ensure comprehensive protection")
+        logger.debug("[STAGE-2] Retaining all Stage 1 detection results to ensure comprehensive protection")
     else:
-        print("[INFO] Stage 2: Skipping contextual validation (document too short or no candidates)")
+        logger.debug("Stage 2: Skipping contextual validation (document too short or no candidates)")
         final_results = stage1_filtered
 
-    print(f"[FINAL] Finally detected {len(final_results)} PII items")
+    logger.info("[FINAL] Finally detected %d PII items", len(final_results))
     return final_results
+
+# ✅ Batch entry point: Extract all PII from several documents with one batched NER pass
+def extract_all_pii_batch(texts, enabled_categories=None):
+    """
+    Extract PII from several documents, batching NER inference across all of them
+
+    Args:
+        texts: List of texts to analyze
+        enabled_categories: A list of selective PII categories to enable, such as ["NAMES", "RACES"]
+                If None, all categories are enabled.
+
+    Returns:
+        list: One PII entity list [(label, value), ...] per input text, in input order
+    """
+    # If not specified, all optional categories are enabled by default.
+    if enabled_categories is None:
+        enabled_categories = _ALL_SELECTABLE
+    else:
+        enabled_categories = frozenset(enabled_categories)
+
+    all_results = [[] for _ in texts]
+    # Nothing to detect in empty or trivially short input; skip NER and Gemini entirely
+    doc_indices = [i for i, text in enumerate(texts) if text and len(text.strip()) >= 2]
+    if not doc_indices:
+        return all_results
+    docs = [texts[i] for i in doc_indices]
+
+    # Initialize Gemini client if not already done
+    ensure_gemini_client()
+
+    logger.info("PII detection started - Enabled categories: %s", sorted(enabled_categories))
+    logger.info("Detection methods: NER + Regex + Dictionary + %s", "Gemini" if gemini_enabled else "No Gemini")
+
+    # --- 1. NER extraction (fine-grained), batched across all documents ---
+    ner_by_doc = [[] for _ in docs]
+    try:
+        ner_by_doc = _run_ner_batch(_get_ner(), docs)
+        logger.info("[NER] Found %d entities across %d document(s)", sum(len(r) for r in ner_by_doc), len(docs))
+
+    except Exception as e:
+        logger.warning("NER extraction failed: %s", e)
+    logger.debug("Continuing with regex and Gemini detection methods")
+
+    if gemini_enabled and len(docs) > 1:
+        # Overlap the Gemini round-trips of different documents; the client's
+        # process-wide semaphore keeps the total in flight at GEMINI_MAX_CONCURRENCY
+        with ThreadPoolExecutor(max_workers=min(GEMINI_MAX_CONCURRENCY, len(docs))) as executor:
+            doc_results = list(executor.map(_extract_document_pii, docs, repeat(enabled_categories), ner_by_doc))
+    else:
+        doc_results = [_extract_document_pii(text, enabled_categories, ner_results)
+                       for text, ner_results in zip(docs, ner_by_doc)]
+    for doc_idx, results in zip(doc_indices, doc_results):
+        all_results[doc_idx] = results
+    return all_results
+
+# ✅ Main function: Extract all PII (with selective filtering + Gemini enhancement)
+def extract_all_pii(text, enabled_categories=None):
+    """
+    Extract PII, support selective category filtering, and integrate Gemini enhanced detection
+
+    Args:
+        text: Text to analyze
+        enabled_categories: A list of selective PII categories to enable, such as ["NAMES", "RACES"]
+                If None, all categories are enabled.
+
+    Returns:
+        list: PII实体列表 [(label, value), ...]
+    """
+    return extract_all_pii_batch([text], enabled_categories)[0]
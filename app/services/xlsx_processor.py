@@ -1,21 +1,23 @@
 # app/services/xlsx_processor.py
 
-import os
 import json
-import re
+import logging
 import hashlib
 from cryptography.fernet import Fernet
 from openpyxl import load_workbook
 from app.services.pii_main import extract_all_pii
+from app.services.enc_tags import split_enc_tags, compile_replacement, replace_outside_tags
+
+logger = logging.getLogger(__name__)
 
 def mask_xlsx_sensitive_text(xlsx_path: str, key_path: str = None, enabled_pii_categories=None):
     if key_path is None:
         key_path = xlsx_path.replace(".xlsx", ".key")
 
-    if os.path.exists(key_path):
+    try:
         with open(key_path, "rb") as f:
             key = f.read()
-    else:
+    except FileNotFoundError:
         key = Fernet.generate_key()
         with open(key_path, "wb") as f:
             f.write(key)
@@ -23,17 +25,20 @@ def mask_xlsx_sensitive_text(xlsx_path: str, key_path: str = None, enabled_pii_c
     fernet = Fernet(key)
     wb = load_workbook(xlsx_path)
 
-    # Extract all text from the workbook first
-    full_text = ""
-    for ws in wb.worksheets:
-        for row in ws.iter_rows():
-            for cell in row:
-                if isinstance(cell.value, str) and cell.value.strip():
-                    full_text += cell.value + " "
+    # Collect the text cells once; they are both the PII input and the cells to mask
+    text_cells = [
+        cell
+        for ws in wb.worksheets
+        for row in ws.iter_rows()
+        for cell in row
+        # isspace() tests for blank text without building a stripped copy
+        if isinstance(cell.value, str) and cell.value and not cell.value.isspace()
+    ]
+    full_text = "".join(cell.value + " " for cell in text_cells)
 
     # Extract all PII at once to avoid duplicates
     all_pii_list = extract_all_pii(full_text, enabled_pii_categories)
-    print(f"print all_pii_list: '{all_pii_list}'")
+    logger.info("Total found %d PII items", len(all_pii_list))
     # Create unique PII mapping with hash-based tags
     unique_pii = {}
     masked_pii = []
@@ -43,7 +48,7 @@ def mask_xlsx_sensitive_text(xlsx_path: str, key_path: str = None, enabled_pii_c
             try:
                 encrypted = fernet.encrypt(value.encode()).decode()
                 # Use hash for unique tags like in text processor
-                value_hash = hashlib.md5(value.encode()).hexdigest()[:8]
+                value_hash = hashlib.blake2b(value.encode(), digest_size=4).hexdigest()
                 unique_tag = f"[ENC:{label}_{value_hash}]"
 
                 unique_pii[value] = {"encrypted": encrypted, "tag": unique_tag}
@@ -54,41 +59,51 @@ def mask_xlsx_sensitive_text(xlsx_path: str, key_path: str = None, enabled_pii_c
                     "masked": unique_tag
                 })
             except Exception as e:
-                print(f"[ERROR] Failed to encrypt '{value}': {e}")
+                logger.error("Failed to encrypt '%s': %s", value, e)
 
     # Sort by length for safe replacement
     sorted_pii_items = sorted(unique_pii.items(), key=lambda x: len(x[0]), reverse=True)
 
-    # Apply safe replacement to each cell
-    for ws in wb.worksheets:
-        for row in ws.iter_rows():
-            for cell in row:
-                if isinstance(cell.value, str) and cell.value.strip():
+    # Compile each replacement pattern once instead of per cell and text part;
+    # other values are matched literally, which str.split does directly
+    replacements = [
+        (pii_value, compile_replacement(pii_value), pii_info["tag"])
+        for pii_value, pii_info in sorted_pii_items
+    ]
+
+    # Workbooks without PII are saved as-is; otherwise a cell is only split and
+    # rewritten when one of the values occurs in it
+    if replacements:
+        # Apply safe replacement to each cell; repeated cell strings (headers, lookup
+        # values) are masked once and reused from the cache
+        mask_cache = {}
+        for cell in text_cells:
+            masked_text = mask_cache.get(cell.value)
+            if masked_text is None:
+                # A value can only match in the plain text between tags, which is always a
+                # substring of the original cell, so a C-level substring test picks the candidates
+                candidates = [replacement for replacement in replacements if replacement[0] in cell.value]
+                if candidates:
+                    # Use the same safe replacement logic as text processor: split around tags
+                    # once and keep that shape instead of re-splitting for every value
+                    segments = split_enc_tags(cell.value)
+                    for pii_value, pattern, tag in candidates:
+                        segments = replace_outside_tags(segments, pii_value, pattern, tag)
+                    masked_text = ''.join(segments)
+                else:
                     masked_text = cell.value
+                mask_cache[cell.value] = masked_text
 
-                    for pii_value, pii_info in sorted_pii_items:
-                        # Use the same safe replacement logic as text processor
-                        parts = re.split(r'(\[ENC:[^\]]+\])', masked_text)
-
-                        for i in range(len(parts)):
-                            if i % 2 == 0 and not parts[i].startswith('[ENC:'):
-                                escaped_pii = re.escape(pii_value)
-                                if len(pii_value) == 1 and pii_value.isdigit():
-                                    pattern = r'\b' + escaped_pii + r'\b'
-                                else:
-                                    pattern = escaped_pii
-                                parts[i] = re.sub(pattern, pii_info["tag"], parts[i])
-
-                        masked_text = ''.join(parts)
-
-                    cell.value = masked_text
+            if masked_text != cell.value:
+                cell.value = masked_text
 
     masked_path = xlsx_path.replace(".xlsx", ".masked.xlsx")
     wb.save(masked_path)
 
     json_path = xlsx_path.replace(".xlsx", ".masked.json")
     with open(json_path, "w", encoding="utf-8") as f:
-        json.dump(masked_pii, f, ensure_ascii=False, indent=2)
+        # Serialize in one call and write once instead of json.dump's many small writes
+        f.write(json.dumps(masked_pii, ensure_ascii=False, indent=2))
 
     return masked_path, json_path, key_path
 
@@ -3,15 +3,21 @@
 Simple server status checker
 """
 
-import requests
+import http.client
 import sys
 
 def check_server():
     try:
-        response = requests.get("http://localhost:8000", timeout=5)
-        print(f"✅ Server is running! Status: {response.status_code}")
+        # http.client keeps this one-request script free of the requests import chain
+        conn = http.client.HTTPConnection("localhost", 8000, timeout=5)
+        try:
+            conn.request("GET", "/")
+            response = conn.getresponse()
+        finally:
+            conn.close()
+        print(f"✅ Server is running! Status: {response.status}")
         return True
-    except requests.exceptions.ConnectionError:
+    except ConnectionError:
         print("❌ Server is not running or not accessible")
         print("💡 To start the server, run: python main.py")
         return False